@@ -1,12 +1,27 @@
 import collections
 import ast
+import importlib
 from dataclasses import dataclass
 import click
 
-from cowidev.utils.slackapi import SlackAPI
 from cowidev.utils.utils import get_traceback
 
 
+def lazy_import(module: str, name: str):
+    """Callable that imports `name` from `module` when it is first called.
+
+    Commands use it for their pipeline functions, so that building the CLI (e.g. `cowid --help`) doesn't import every
+    pipeline and its dependencies.
+    """
+
+    def _call(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+    _call.__name__ = name
+    _call.__qualname__ = name
+    return _call
+
+
 def feedback_log(func, server, domain, step=None, text_success="", hide_success=False, **function_kwargs):
     if step is None:
         header = domain
@@ -160,6 +175,8 @@ class StepReport:
         return f"{self.type}: {self.text}"
 
     def to_slack(report, channel="#corona-data-updates"):
+        from cowidev.utils.slackapi import SlackAPI
+
         client = SlackAPI()
         kwargs = {
             "channel": channel,
@@ -1,7 +1,9 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
-from cowidev.decoupling import main, update_db
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
+
+main = lazy_import("cowidev.decoupling", "main")
+update_db = lazy_import("cowidev.decoupling", "update_db")
 
 
 @click.group(name="decoupling", chain=True, cls=OrderedGroup)
@@ -1,8 +1,10 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
-from cowidev.gmobility.etl import run_etl
-from cowidev.gmobility.grapher import run_grapheriser, run_db_updater
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
+
+run_etl = lazy_import("cowidev.gmobility.etl", "run_etl")
+run_grapheriser = lazy_import("cowidev.gmobility.grapher", "run_grapheriser")
+run_db_updater = lazy_import("cowidev.gmobility.grapher", "run_db_updater")
 
 
 @click.group(name="gmobility", chain=True, cls=OrderedGroup)
@@ -1,11 +1,13 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, Country2Module, PythonLiteralOption, feedback_log
+from cowidev.cmd.commons.utils import OrderedGroup, Country2Module, PythonLiteralOption, feedback_log, lazy_import
 from cowidev.utils.params import CONFIG
-from cowidev.hosp.etl import run_etl
-from cowidev.hosp.grapher import run_db_updater, run_grapheriser
 from cowidev.hosp.countries import MODULES_NAME, country_to_module
 
+run_etl = lazy_import("cowidev.hosp.etl", "run_etl")
+run_db_updater = lazy_import("cowidev.hosp.grapher", "run_db_updater")
+run_grapheriser = lazy_import("cowidev.hosp.grapher", "run_grapheriser")
+
 
 @click.group(name="hosp", chain=True, cls=OrderedGroup)
 @click.pass_context
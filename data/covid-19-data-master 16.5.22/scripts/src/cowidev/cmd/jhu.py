@@ -1,10 +1,13 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
-from cowidev.jhu.__main__ import download_csv, main, update_db
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
 from cowidev.cmd.commons.utils import StepReport
 from cowidev.utils.utils import get_traceback
 
+download_csv = lazy_import("cowidev.jhu.__main__", "download_csv")
+main = lazy_import("cowidev.jhu.__main__", "main")
+update_db = lazy_import("cowidev.jhu.__main__", "update_db")
+
 
 @click.group(name="jhu", chain=True, cls=OrderedGroup)
 @click.pass_context
@@ -28,8 +31,26 @@ def click_jhu_download(ctx):
 
 
 @click.command(name="generate", short_help="Step 2: Generate dataset.")
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    help="Reuse derived metrics of the previous run and only recompute rows that changed since then.",
+    show_default=True,
+)
+@click.option(
+    "--force/--no-force",
+    default=False,
+    help="Generate dataset even if JHU inputs didn't change since the last run.",
+    show_default=True,
+)
+@click.option(
+    "--verify/--no-verify",
+    default=False,
+    help="With --incremental, check that derived metrics match a full recomputation.",
+    show_default=True,
+)
 @click.pass_context
-def click_jhu_generate(ctx):
+def click_jhu_generate(ctx, incremental, force, verify):
     feedback_log(
         func=main,
         server=ctx.obj["server"],
@@ -38,6 +59,9 @@ def click_jhu_generate(ctx):
         text_success="Public data files generated.",
         logger=ctx.obj["logger"],
         skip_download=True,
+        incremental=incremental,
+        force=force,
+        verify=verify,
     )
 
 
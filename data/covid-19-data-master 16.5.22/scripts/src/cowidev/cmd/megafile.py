@@ -1,11 +1,24 @@
 import click
-from cowidev.megafile.generate import generate_megafile
-from cowidev.cmd.commons.utils import feedback_log
+from cowidev.cmd.commons.utils import feedback_log, lazy_import
+
+generate_megafile = lazy_import("cowidev.megafile.generate", "generate_megafile")
 
 
 @click.command(name="megafile")
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    help="Reuse cached step outputs and only regenerate what changed since the last run.",
+    show_default=True,
+)
+@click.option(
+    "--shards/--no-shards",
+    default=False,
+    help="Also export the dataset as one CSV and Parquet file per location, plus a manifest.",
+    show_default=True,
+)
 @click.pass_context
-def click_megafile(ctx):
+def click_megafile(ctx, incremental, shards):
     """COVID-19 data integration pipeline (former megafile)"""
     feedback_log(
         func=generate_megafile,
@@ -14,4 +27,6 @@ def click_megafile(ctx):
         domain="Megafile",
         text_success="Public data files generated.",
         hide_success=True,
+        incremental=incremental,
+        shards=shards,
     )
@@ -1,10 +1,12 @@
 import click
 
 from cowidev import PATHS
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
 from cowidev.utils.utils import get_traceback
-from cowidev.oxcgrt.etl import run_etl
-from cowidev.oxcgrt.grapher import run_grapheriser, run_db_updater
+
+run_etl = lazy_import("cowidev.oxcgrt.etl", "run_etl")
+run_grapheriser = lazy_import("cowidev.oxcgrt.grapher", "run_grapheriser")
+run_db_updater = lazy_import("cowidev.oxcgrt.grapher", "run_db_updater")
 
 
 @click.group(name="oxcgrt", chain=True, cls=OrderedGroup)
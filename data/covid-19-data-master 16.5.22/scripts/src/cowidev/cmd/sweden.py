@@ -1,7 +1,10 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
-from cowidev.sweden import download_data, generate_dataset, update_db
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
+
+download_data = lazy_import("cowidev.sweden", "download_data")
+generate_dataset = lazy_import("cowidev.sweden", "generate_dataset")
+update_db = lazy_import("cowidev.sweden", "update_db")
 
 
 @click.group(name="sweden", chain=True, cls=OrderedGroup)
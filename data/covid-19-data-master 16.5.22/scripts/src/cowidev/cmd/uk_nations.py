@@ -1,7 +1,9 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
-from cowidev.uk_nations import generate_dataset, update_db
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
+
+generate_dataset = lazy_import("cowidev.uk_nations", "generate_dataset")
+update_db = lazy_import("cowidev.uk_nations", "update_db")
 
 
 @click.group(name="uk-nations", chain=True, cls=OrderedGroup)
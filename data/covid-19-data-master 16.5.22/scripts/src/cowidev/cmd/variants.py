@@ -1,8 +1,10 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
-from cowidev.variants.etl import run_etl
-from cowidev.variants.grapher import run_grapheriser, run_explorerizer
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
+
+run_etl = lazy_import("cowidev.variants.etl", "run_etl")
+run_grapheriser = lazy_import("cowidev.variants.grapher", "run_grapheriser")
+run_explorerizer = lazy_import("cowidev.variants.grapher", "run_explorerizer")
 
 
 @click.group(name="variants", chain=True, cls=OrderedGroup)
@@ -1,9 +1,10 @@
 import click
 
-from cowidev.megafile.generate import generate_megafile
-from cowidev.cmd.commons.utils import StepReport
+from cowidev.cmd.commons.utils import StepReport, lazy_import
 from cowidev.utils.utils import get_traceback
 
+generate_megafile = lazy_import("cowidev.megafile.generate", "generate_megafile")
+
 
 @click.command(name="export", short_help="Step 4: Export vaccination data and merge with global dataset.")
 @click.pass_context
@@ -1,9 +1,10 @@
 import click
 
-from cowidev.cmd.vax.generate.utils import DatasetGenerator
-from cowidev.cmd.commons.utils import StepReport
+from cowidev.cmd.commons.utils import StepReport, lazy_import
 from cowidev.utils.utils import get_traceback
 
+DatasetGenerator = lazy_import("cowidev.cmd.vax.generate.utils", "DatasetGenerator")
+
 
 @click.command(name="generate", short_help="Step 3: Generate vaccination dataset.")
 @click.pass_context
@@ -13,6 +13,7 @@ from cowidev import PATHS
 from cowidev.utils.clean.dates import localdate
 from cowidev.utils.utils import pd_series_diff_values
 from cowidev.utils.clean import clean_date
+from cowidev.utils.inputs import read_input
 from cowidev.utils.log import get_logger
 from cowidev.vax.utils.checks import VACCINES_ACCEPTED
 
@@ -271,7 +272,7 @@ class DatasetGenerator:
     def get_population(self, df_subnational: pd.DataFrame) -> pd.DataFrame:
         # Build population dataframe
         column_rename = {"entity": "location", "population": "population"}
-        pop = pd.read_csv(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE, usecols=column_rename.keys()).rename(
+        pop = read_input(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE, usecols=list(column_rename.keys())).rename(
             columns=column_rename
         )
         pop = pd.concat([pop, df_subnational], ignore_index=True)
@@ -720,7 +721,7 @@ class DatasetGenerator:
                 "Internal files not found! Make sure to run `proccess-data` step prior to running `generate-dataset`."
             )
 
-        df_iso = pd.read_csv(PATHS.INTERNAL_INPUT_ISO_FILE)
+        df_iso = read_input(PATHS.INTERNAL_INPUT_ISO_FILE)
         files_manufacturer = glob.glob(os.path.join(PATHS.INTERNAL_OUTPUT_VAX_MANUFACT_DIR, "*.csv"))
         df_manufacturer = pd.concat(
             (pd.read_csv(filepath, parse_dates=["date"]) for filepath in files_manufacturer),
@@ -1,11 +1,12 @@
 import click
 
-from cowidev.cmd.commons.get import main_get_data
-from cowidev.cmd.commons.utils import Country2Module, PythonLiteralOption
+from cowidev.cmd.commons.utils import Country2Module, PythonLiteralOption, lazy_import
 from cowidev.utils.params import CONFIG
 from cowidev.utils import paths
 from cowidev.vax.countries import MODULES_NAME, MODULES_NAME_BATCH, MODULES_NAME_INCREMENTAL, country_to_module
 
+main_get_data = lazy_import("cowidev.cmd.commons.get", "main_get_data")
+
 
 @click.command(name="get", short_help="Step 1: Scrape vaccination data from primary sources.")
 # @click.option(
@@ -1,7 +1,8 @@
 import click
 
-from cowidev.vax.icer import main
-from cowidev.cmd.commons.utils import feedback_log
+from cowidev.cmd.commons.utils import feedback_log, lazy_import
+
+main = lazy_import("cowidev.vax.icer", "main")
 
 
 @click.command(
@@ -10,8 +10,10 @@ from cowidev import PATHS
 from cowidev.utils.log import get_logger
 from cowidev.utils.params import CONFIG
 from cowidev.utils.utils import export_timestamp, get_traceback
-from cowidev.cmd.vax.process.utils import process_location, VaccinationGSheet
-from cowidev.cmd.commons.utils import StepReport
+from cowidev.cmd.commons.utils import StepReport, lazy_import
+
+process_location = lazy_import("cowidev.cmd.vax.process.utils", "process_location")
+VaccinationGSheet = lazy_import("cowidev.cmd.vax.process.utils", "VaccinationGSheet")
 
 
 @click.command(name="process", short_help="Step 2: Process scraped vaccination data from primary sources.")
@@ -2,7 +2,9 @@ import os
 
 import click
 
-from cowidev.cmd.vax.track.countries import country_updates_summary
+from cowidev.cmd.commons.utils import lazy_import
+
+country_updates_summary = lazy_import("cowidev.cmd.vax.track.countries", "country_updates_summary")
 
 
 @click.command(name="track", short_help="Explore high-level analytics of vaccination dataset.")
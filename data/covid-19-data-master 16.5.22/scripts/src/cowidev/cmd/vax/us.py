@@ -1,8 +1,10 @@
 import click
 
 from cowidev import PATHS
-from cowidev.vax.us_states import run_etl, run_grapheriser
-from cowidev.cmd.commons.utils import feedback_log
+from cowidev.cmd.commons.utils import feedback_log, lazy_import
+
+run_etl = lazy_import("cowidev.vax.us_states", "run_etl")
+run_grapheriser = lazy_import("cowidev.vax.us_states", "run_grapheriser")
 
 
 @click.command(name="us-states", short_help="US vaccinations data pipeline.")
@@ -1,7 +1,8 @@
 import click
 
-from cowidev.cmd.commons.utils import OrderedGroup, feedback_log
-from cowidev.xm.etl import run_etl
+from cowidev.cmd.commons.utils import OrderedGroup, feedback_log, lazy_import
+
+run_etl = lazy_import("cowidev.xm.etl", "run_etl")
 
 
 @click.group(name="xm", chain=True, cls=OrderedGroup)
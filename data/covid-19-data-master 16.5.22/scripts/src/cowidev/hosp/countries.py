@@ -1,4 +1,9 @@
-from cowidev.hosp.sources import __all__ as countries
+import os
+
+from cowidev.utils import list_modules
+
+
+countries = list_modules(os.path.join(os.path.dirname(__file__), "sources"))
 
 
 # Import modules
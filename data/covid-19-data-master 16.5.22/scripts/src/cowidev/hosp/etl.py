@@ -9,6 +9,7 @@ import pandas as pd
 from pandas.api.types import is_string_dtype
 
 from cowidev import PATHS
+from cowidev.utils.inputs import read_input
 from cowidev.utils.log import get_logger
 
 
@@ -186,7 +187,7 @@ class HospETL:
     def pipe_metadata(self, df):
         print("Adding ISO & population…")
         shape_og = df.shape
-        population = pd.read_csv(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE, usecols=["entity", "iso_code", "population"])
+        population = read_input(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE, usecols=["entity", "iso_code", "population"])
         df = df.merge(population, on="entity")
         if shape_og[0] != df.shape[0]:
             raise ValueError(f"Dimension 0 after merge is different: {shape_og[0]} --> {df.shape[0]}")
@@ -1,4 +1,6 @@
 """Collect JHU Cases/Deaths data"""
+import hashlib
+import json
 import os
 import sys
 import pandas as pd
@@ -22,18 +24,32 @@ from cowidev.jhu.shared import (
     inject_weekly_growth,
     inject_biweekly_growth,
     standard_export,
+    time_series_path,
+    POPULATION_CSV_PATH,
+    TIME_SERIES_URL,
+    PIPELINE_VERSION,
+    TMP_DIR,
     ZERO_DAY,
 )
+from cowidev.jhu.incremental import JHUState
+from cowidev.jhu.subnational import create_subnational
 from cowidev.grapher.db.utils.slack_client import send_warning, send_success
 from cowidev.grapher.db.utils.db_imports import import_dataset
 from cowidev import PATHS
-from cowidev.utils.s3 import obj_to_s3
+from cowidev.utils.log import get_logger
+from cowidev.utils.s3 import file_hash
+from cowidev.utils.web.download import download_files
 
 
 INPUT_PATH = PATHS.INTERNAL_INPUT_JHU_DIR
 OUTPUT_PATH = PATHS.DATA_JHU_DIR
 TMP_PATH = PATHS.INTERNAL_TMP_DIR
 LOCATIONS_CSV_PATH = PATHS.INTERNAL_INPUT_JHU_STD_FILE
+# JHU time series (national and subnational exports)
+TIME_SERIES = [(metric, region) for region in ["global", "US"] for metric in ["confirmed", "deaths"]]
+DOWNLOADS_CACHE_PATH = os.path.join(TMP_DIR, "downloads.json")
+# Inputs of the last successful run (if they didn't change, there is nothing to update)
+LAST_RUN_PATH = os.path.join(TMP_DIR, "last_run.json")
 
 ERROR = colored("[Error]", "red")
 WARNING = colored("[Warning]", "yellow")
@@ -71,7 +87,7 @@ def print_err(*args, **kwargs):
 
 
 def get_metric(metric, region):
-    file_path = os.path.join(INPUT_PATH, f"time_series_covid19_{metric}_{region}.csv")
+    file_path = time_series_path(metric, region)
     df = pd.read_csv(file_path).drop(columns=["Lat", "Long"])
 
     if metric == "confirmed":
@@ -193,25 +209,42 @@ def check_data_correctness(df_merged):
     return errors == 0
 
 
-def hide_recent_zeros(df: pd.DataFrame) -> pd.DataFrame:
-    last_reported_date = df.date.max()
-
-    last_positive_cases_date = df.loc[df.new_cases > 0, "date"].max()
-    if pd.isnull(last_positive_cases_date):
-        return df
-    if last_positive_cases_date != last_reported_date:
-        last_known_cases = df.loc[df.date == last_positive_cases_date, "new_cases"].item()
-        if last_known_cases >= 100 and (last_reported_date - last_positive_cases_date).days < 7:
-            df.loc[df.date > last_positive_cases_date, "new_cases"] = np.nan
-
-    last_positive_deaths_date = df.loc[df.new_deaths > 0, "date"].max()
-    if pd.isnull(last_positive_deaths_date):
-        return df
-    if last_positive_deaths_date != last_reported_date:
-        last_known_deaths = df.loc[df.date == last_positive_deaths_date, "new_deaths"].item()
-        if last_known_deaths >= 10 and (last_reported_date - last_positive_deaths_date).days < 7:
-            df.loc[df.date > last_positive_deaths_date, "new_deaths"] = np.nan
+def _recent_zeros_mask(df: pd.DataFrame, column: str, threshold: int, dates: np.ndarray, last_dates: np.ndarray):
+    """Mask of rows in `column` after the last positive value of each location, if that value is >= `threshold` and
+    was reported less than 7 days before the location's last date.
+
+    `df` must be sorted by location and date, `dates` are its dates and `last_dates` the last date of each row's
+    location.
+    """
+    values = df[column].to_numpy(dtype=float)
+    position = np.arange(len(df))
+    # Position of the last positive value of each row's location (-1 if there is none)
+    last_positive = (
+        pd.Series(np.where(values > 0, position, -1), index=df.index).groupby(df.location.to_numpy()).transform("max")
+    ).to_numpy()
+    has_positive = last_positive >= 0
+    last_positive = np.where(has_positive, last_positive, 0)
+    mask = (
+        has_positive
+        & (position > last_positive)
+        & (values[last_positive] >= threshold)
+        & (last_dates - dates[last_positive] < np.timedelta64(7, "D"))
+    )
+    return mask, has_positive
+
 
+def hide_recent_zeros(df: pd.DataFrame) -> pd.DataFrame:
+    """Set to NA the latest zero new_cases (new_deaths) of each location, if the last known value is at least 100
+    cases (10 deaths) and was reported less than 7 days before.
+
+    `df` must be sorted by location and date. Deaths are not checked for locations that never reported new cases.
+    """
+    dates = pd.to_datetime(df.date).to_numpy()
+    last_dates = pd.Series(dates, index=df.index).groupby(df.location.to_numpy()).transform("max").to_numpy()
+    mask_cases, has_cases = _recent_zeros_mask(df, "new_cases", 100, dates, last_dates)
+    mask_deaths, _ = _recent_zeros_mask(df, "new_deaths", 10, dates, last_dates)
+    df.loc[mask_cases, "new_cases"] = np.nan
+    df.loc[mask_deaths & has_cases, "new_deaths"] = np.nan
     return df
 
 
@@ -222,23 +255,35 @@ def discard_rows(df):
     df.loc[df.new_cases < 0, "new_cases"] = np.nan
     df.loc[df.new_deaths < 0, "new_deaths"] = np.nan
 
-    # Custom data corrections
-    for ldc in LARGE_DATA_CORRECTIONS:
-        df.loc[(df.location == ldc[0]) & (df.date.astype(str) == ldc[1]), f"new_{ldc[2]}"] = np.nan
+    # Custom data corrections, looked up by (location, date) for each metric
+    keys = pd.MultiIndex.from_arrays([df.location, df.date.astype(str)])
+    corrections = pd.DataFrame(LARGE_DATA_CORRECTIONS, columns=["location", "date", "metric"])
+    for metric, df_corrections in corrections.groupby("metric"):
+        mask = keys.isin(list(df_corrections[["location", "date"]].itertuples(index=False, name=None)))
+        df.loc[mask, f"new_{metric}"] = np.nan
 
     # If the last known value is above 1000 cases or 100 deaths but the latest reported value is 0
     # then set that value to NA in case it's a temporary reporting error. (Up to 7 days in the past)
-    df = df.sort_values(["location", "date"]).groupby("location").apply(hide_recent_zeros)
+    df = hide_recent_zeros(df.sort_values(["location", "date"]))
 
     return df
 
 
-def load_standardized(df):
+def load_base(df):
+    """Daily cases and deaths of each location after data corrections, plus OWID aggregates."""
     df = df[["date", "location", "new_cases", "new_deaths", "total_cases", "total_deaths"]]
     df = discard_rows(df)
-    df = inject_owid_aggregates(df)
+    return inject_owid_aggregates(df)
+
+
+def inject_metrics(df):
+    """Derived metrics of the base data (see `load_base`)."""
     df = inject_weekly_growth(df)
     df = inject_biweekly_growth(df)
+    # Zero totals are reported as missing
+    df[["total_cases", "total_deaths"]] = df[["total_cases", "total_deaths"]].mask(
+        df[["total_cases", "total_deaths"]] == 0
+    )
     df = inject_doubling_days(df)
     df = inject_per_million(
         df,
@@ -256,11 +301,25 @@ def load_standardized(df):
     df = inject_rolling_avg(df)
     df = inject_cfr(df)
     df = inject_days_since(df)
+    return df
+
+
+def load_standardized(df, incremental: bool = False, logger=None, verify: bool = False):
+    """Standardized dataset, with all derived metrics.
+
+    With `incremental=True`, derived metrics are only recomputed for the rows that changed since the previous
+    incremental run (see `cowidev.jhu.incremental`). With `verify=True`, they are checked against a full run.
+    """
+    df = load_base(df)
+    if incremental:
+        df = JHUState().update(df, inject_metrics, logger, verify=verify)
+    else:
+        df = inject_metrics(df)
     df = inject_exemplars(df)
     return df.sort_values(by=["location", "date"])
 
 
-def export(df_merged):
+def export(df_merged, incremental: bool = False, logger=None, verify: bool = False):
     df_loc = df_merged[["Country/Region", "location"]].drop_duplicates()
     df_loc = df_loc.merge(load_owid_continents(), on="location", how="left")
     df_loc = inject_population(df_loc)
@@ -269,101 +328,35 @@ def export(df_merged):
     df_loc = df_loc.sort_values("location")
     df_loc.to_csv(os.path.join(OUTPUT_PATH, "locations.csv"), index=False)
     # The rest of the CSVs
-    return standard_export(load_standardized(df_merged), OUTPUT_PATH, DATASET_NAME)
+    return standard_export(load_standardized(df_merged, incremental, logger, verify), OUTPUT_PATH, DATASET_NAME)
 
 
-def clean_global_subnational(metric):
-    url = f"https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_{metric}_global.csv"
-    metric = "cases" if metric == "confirmed" else "deaths"
+def _inputs_signature() -> dict:
+    """Hashes of the input files and of the data corrections, plus the pipeline version."""
+    paths = [time_series_path(metric, region) for metric, region in TIME_SERIES]
+    signature = {path: file_hash(path) for path in paths + [LOCATIONS_CSV_PATH, POPULATION_CSV_PATH]}
+    corrections = json.dumps(sorted(LARGE_DATA_CORRECTIONS)).encode()
+    signature["large_data_corrections"] = hashlib.sha256(corrections).hexdigest()
+    signature["version"] = PIPELINE_VERSION
+    return signature
 
-    df = (
-        pd.read_csv(url, na_values="")
-        .drop(columns=["Lat", "Long"])
-        .dropna(subset=["Province/State"])
-        .melt(id_vars=["Country/Region", "Province/State"], var_name="date", value_name=f"total_{metric}")
-        .rename(columns={"Country/Region": "location1", "Province/State": "location2"})
-    )
-    df["date"] = pd.to_datetime(df.date).dt.date.astype(str)
-    df = df.sort_values(["location1", "location2", "date"])
-    df[f"new_{metric}"] = df[f"total_{metric}"] - df.groupby(["location1", "location2"])[f"total_{metric}"].shift(1)
-    df[f"new_{metric}_smoothed"] = (
-        df.groupby(["location1", "location2"]).rolling(7)[f"new_{metric}"].mean().droplevel(level=[0, 1]).round(2)
-    )
-    df["location3"] = pd.NA
-    return df
 
-
-def clean_us_subnational(metric):
-    url = f"https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_{metric}_US.csv"
-    metric = "cases" if metric == "confirmed" else "deaths"
-
-    df = (
-        pd.read_csv(url)
-        .drop(
-            columns=[
-                "UID",
-                "iso2",
-                "iso3",
-                "code3",
-                "FIPS",
-                "Country_Region",
-                "Lat",
-                "Long_",
-                "Combined_Key",
-                "Population",
-            ],
-            errors="ignore",
-        )
-        .melt(id_vars=["Province_State", "Admin2"], var_name="date", value_name=f"total_{metric}")
-        .rename(columns={"Province_State": "location2", "Admin2": "location3"})
-    )
-    df["date"] = pd.to_datetime(df.date).dt.date.astype(str)
-    df = df.sort_values(["location2", "location3", "date"])
-    df[f"new_{metric}"] = df[f"total_{metric}"] - df.groupby(["location2", "location3"])[f"total_{metric}"].shift(1)
-    df[f"new_{metric}_smoothed"] = (
-        df.groupby(["location2", "location3"]).rolling(7)[f"new_{metric}"].mean().droplevel(level=[0, 1]).round(2)
-    )
-    df["location1"] = "United States"
-    return df
-
-
-def create_subnational():
-    global_cases = clean_global_subnational("confirmed")
-    global_deaths = clean_global_subnational("deaths")
-    us_cases = clean_us_subnational("confirmed")
-    us_deaths = clean_us_subnational("deaths")
-
-    df = pd.concat(
-        [
-            pd.merge(global_cases, global_deaths, on=["location1", "location2", "location3", "date"], how="outer"),
-            pd.merge(us_cases, us_deaths, on=["location1", "location2", "location3", "date"], how="outer"),
-        ]
-    ).sort_values(["location1", "location2", "location3", "date"])[
-        [
-            "location1",
-            "location2",
-            "location3",
-            "date",
-            "total_cases",
-            "new_cases",
-            "new_cases_smoothed",
-            "total_deaths",
-            "new_deaths",
-            "new_deaths_smoothed",
-        ]
-    ]
-    df = df[df.total_cases > 0]
-    filename = "subnational_cases_deaths"
-    compression = {"method": "zip", "archive_name": f"{filename}.csv"}
-    # df.to_csv(os.path.join(OUTPUT_PATH, f"{filename}.zip"), index=False, compression=compression)
-    obj_to_s3(df, s3_path="s3://covid-19/public/jhu/{filename}.zip", compression=compression, public=True)
-
-
-def main(logger, skip_download=False):
+def main(logger, skip_download=False, incremental=False, force=False, verify=False):
 
     if not skip_download:
         logger.info("\nAttempting to download latest CSV files...")
-        download_csv()
+        download_csv(logger)
+    paths = [time_series_path(metric, region) for metric, region in TIME_SERIES]
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        raise FileNotFoundError(f"Missing JHU time series {missing}. Download them first (`cowid jhu get`).")
+
+    signature = _inputs_signature()
+    if not force and os.path.isfile(LAST_RUN_PATH):
+        with open(LAST_RUN_PATH, "r") as f:
+            if json.load(f) == signature:
+                logger.info("JHU inputs did not change since the last run, nothing to update.")
+                return
 
     df_merged = _load_merged()
 
@@ -374,7 +367,7 @@ def main(logger, skip_download=False):
         raise ValueError("Data correctness check failed.")
         # sys.exit(1)
 
-    if export(df_merged):
+    if export(df_merged, incremental, logger, verify):
         logger.info("Successfully exported CSVs to %s\n" % colored(os.path.abspath(OUTPUT_PATH), "magenta"))
     else:
         logger.error("JHU export failed.\n")
@@ -392,16 +385,19 @@ def main(logger, skip_download=False):
 
     # Export timestamp
     export_timestamp(PATHS.DATA_TIMESTAMP_JHU_FILE)
+    with open(LAST_RUN_PATH, "w") as f:
+        json.dump(signature, f, indent=2)
 
 
 def download_csv(logger):
-    files = ["time_series_covid19_confirmed_global.csv", "time_series_covid19_deaths_global.csv"]
-    for file in files:
-        logger.info(file)
-        os.system(
-            f"curl --silent -f -o {INPUT_PATH}/{file} -L"
-            f" https://github.com/CSSEGISandData/COVID-19/raw/master/csse_covid_19_data/csse_covid_19_time_series/{file}"
-        )
+    """Download JHU time series that changed upstream since their last download."""
+    files = {
+        f"{TIME_SERIES_URL}/time_series_covid19_{metric}_{region}.csv": time_series_path(metric, region)
+        for metric, region in TIME_SERIES
+    }
+    changed = download_files(files, DOWNLOADS_CACHE_PATH)
+    for url, path in files.items():
+        logger.info(f"{os.path.basename(path)}: {'updated' if changed[url] else 'unchanged'}")
 
 
 def update_db():
@@ -416,10 +412,11 @@ def update_db():
 
 
 def run_step(step: str, skip_download):
+    logger = get_logger()
     if step == "download":
-        download_csv()
+        download_csv(logger)
     if step == "etl":
-        main(skip_download=skip_download)
+        main(logger, skip_download=skip_download)
     elif step == "grapher-db":
         update_db()
 
@@ -0,0 +1,217 @@
+"""State of the incremental JHU pipeline (`cowid jhu generate --incremental`).
+
+JHU time series are append-only in practice: each day adds a new date, with occasional revisions of past values. The
+state keeps, as Feather files, the base data of the previous run (cases and deaths after data corrections, including
+OWID aggregates) and its derived metrics. In the next run, the new base data is compared with the previous one, and
+derived metrics are only recomputed for the rows of each location from its first changed row on, using the `LOOKBACK`
+previous rows as context. Earlier rows (and locations without changes) are reused.
+
+Derived metrics of a row only depend on the previous rows of its location, except for:
+    - 'days since' metrics, which depend on the date the threshold was first reached. These are anchored to that date
+      if it is among the reused rows. Otherwise (e.g. the threshold is reached for the first time), the whole location
+      is recomputed.
+    - rolling averages, as pandas rolling means accumulate floating point state from the first row of each location
+      (which can change the last rounded decimal). These are recomputed over all rows of the changed locations.
+
+With `verify=True`, the metrics are also computed from scratch and both results are checked to be equal.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cowidev.jhu.shared import (
+    PIPELINE_VERSION,
+    POPULATION_CSV_PATH,
+    TMP_DIR,
+    days_since_spec,
+    doubling_days_spec,
+    inject_rolling_avg,
+    rolling_avg_spec,
+)
+
+
+STATE_DIR = TMP_DIR
+KEYS = ["location", "date"]
+
+# Number of previous rows a row's derived metrics depend on. Biweekly growth compares the 14-day sum with the one 14
+# days before (27 previous rows), the other metrics look back less.
+LOOKBACK = max(
+    2 * 14 - 1,
+    *(spec["window"] - 1 for spec in rolling_avg_spec.values()),
+    *(spec["periods"] for spec in doubling_days_spec.values()),
+)
+# Rows are matched by integer key location_code * MAX_DAYS + day_number
+MAX_DAYS = 100_000
+
+
+def _file_signature(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _day_numbers(dates: pd.Series) -> np.ndarray:
+    return pd.to_datetime(dates).to_numpy().astype("datetime64[D]").astype(np.int64)
+
+
+def _row_hashes(df: pd.DataFrame, columns: list) -> np.ndarray:
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def first_changes(df: pd.DataFrame, df_old: pd.DataFrame, days: np.ndarray, days_old: np.ndarray) -> pd.Series:
+    """First day number of each location in `df` with a row added, removed or modified with respect to `df_old`.
+
+    `days` and `days_old` are the day numbers of the rows of `df` and `df_old`. Locations without changes are not
+    included.
+    """
+    locations = pd.Index(df.location.unique()).union(pd.Index(df_old.location.unique()))
+    keys = pd.Index(locations.get_indexer(df.location) * MAX_DAYS + days)
+    keys_old = pd.Index(locations.get_indexer(df_old.location) * MAX_DAYS + days_old)
+    columns = sorted(df.columns.difference(KEYS))
+    hashes = _row_hashes(df, columns)
+    if sorted(df_old.columns.difference(KEYS)) == columns:
+        hashes_old = _row_hashes(df_old, columns)
+    else:
+        hashes_old = np.zeros(len(df_old), dtype=hashes.dtype)
+    match = keys_old.get_indexer(keys)
+    changed = (match == -1) | (hashes_old[match] != hashes)
+    removed = keys.get_indexer(keys_old) == -1
+    changed_keys = np.concatenate([keys[changed], keys_old[removed]])
+    return pd.Series(changed_keys % MAX_DAYS).groupby(locations[changed_keys // MAX_DAYS]).min()
+
+
+def check_equal(df: pd.DataFrame, df_expected: pd.DataFrame):
+    """Raise if derived metrics `df` (e.g. from an incremental run) differ from `df_expected` (from a full run)."""
+    df = df.sort_values(KEYS).reset_index(drop=True)
+    df_expected = df_expected.sort_values(KEYS).reset_index(drop=True)
+    if list(df.columns) != list(df_expected.columns):
+        raise ValueError(f"Incremental metrics have different columns than a full run: {list(df.columns)}")
+    if not df[KEYS].equals(df_expected[KEYS]):
+        raise ValueError("Incremental metrics have different (location, date) rows than a full run.")
+    different = [col for col in df.columns if not df[col].equals(df_expected[col])]
+    if different:
+        raise ValueError(f"Incremental metrics differ from a full run in columns: {different}")
+
+
+class JHUState:
+    def __init__(self, state_dir: str = STATE_DIR, inputs: list = None):
+        self.state_dir = state_dir
+        # Static inputs that derived metrics depend on (if any changes, everything is recomputed)
+        self.inputs = [POPULATION_CSV_PATH] if inputs is None else inputs
+        self._meta_path = os.path.join(state_dir, "state.json")
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, f"{name}.feather")
+
+    def _signature(self) -> dict:
+        return {path: _file_signature(path) for path in self.inputs}
+
+    def load(self):
+        """Base data and derived metrics of the previous run. None if there is no (valid) state."""
+        if not os.path.isfile(self._meta_path):
+            return None
+        with open(self._meta_path, "r") as f:
+            meta = json.load(f)
+        if (
+            meta.get("inputs") != self._signature()
+            or meta.get("lookback") != LOOKBACK
+            or meta.get("version") != PIPELINE_VERSION
+        ):
+            return None
+        return pd.read_feather(self._path("base")), pd.read_feather(self._path("metrics"))
+
+    def save(self, df_base: pd.DataFrame, df_metrics: pd.DataFrame):
+        os.makedirs(self.state_dir, exist_ok=True)
+        df_base.reset_index(drop=True).to_feather(self._path("base"), compression="uncompressed")
+        df_metrics.reset_index(drop=True).to_feather(self._path("metrics"), compression="uncompressed")
+        with open(self._meta_path, "w") as f:
+            json.dump({"inputs": self._signature(), "lookback": LOOKBACK, "version": PIPELINE_VERSION}, f, indent=2)
+
+    def update(self, df_base: pd.DataFrame, func, logger=None, verify: bool = False) -> pd.DataFrame:
+        """Derived metrics of `df_base` (i.e. `func(df_base)`), only recomputing the rows that changed since the
+        previous run. The new state is saved.
+
+        With `verify=True`, raise if the result differs from `func(df_base)` (computed from scratch).
+        """
+        df_base = df_base.sort_values(KEYS).reset_index(drop=True)
+        state = self.load()
+        # None if there is no state, or metrics of the previous run don't have the same columns (i.e. the code changed)
+        df_metrics = None if state is None else self._update(df_base, *state, func)
+        if df_metrics is None:
+            df_metrics = func(df_base.copy())
+            self.save(df_base, df_metrics)
+            return df_metrics
+        reused = df_metrics.attrs.pop("reused")
+        if logger is not None:
+            logger.info(f"Reused derived metrics of {reused}/{len(df_metrics)} rows.")
+        if verify:
+            check_equal(df_metrics, func(df_base.copy()))
+        if reused < len(df_metrics):
+            self.save(df_base, df_metrics)
+        return df_metrics
+
+    def _update(self, df_base, df_base_old, df_metrics_old, func):
+        days = _day_numbers(df_base.date)
+        days_old = _day_numbers(df_metrics_old.date)
+        # First changed day of each location
+        changes = first_changes(df_base, df_base_old, days, _day_numbers(df_base_old.date))
+        if changes.empty:
+            df_metrics_old.attrs["reused"] = len(df_metrics_old)
+            return df_metrics_old
+        # Day each location first reached each 'days since' threshold in the previous run (NaN if never)
+        anchors = {
+            col: pd.Series(days_old - df_metrics_old[col].to_numpy(dtype=float, na_value=np.nan))
+            .groupby(df_metrics_old.location.to_numpy())
+            .min()
+            for col in days_since_spec
+        }
+        # Locations that reached a threshold in a changed row are fully recomputed
+        full = {
+            location
+            for anchor in anchors.values()
+            for location, first in anchor.reindex(changes.index).items()
+            if first >= changes[location]
+        }
+        df = self._recompute(df_base, days, changes, full, func)
+        # Days since thresholds reached in reused rows are counted from that day. Locations that reached a threshold
+        # for the first time are recomputed
+        days_new = _day_numbers(df.date)
+        partial = ~df.location.isin(full).to_numpy()
+        new_full = set()
+        for col, anchor in anchors.items():
+            first = df.location.map(anchor).to_numpy(dtype=float)
+            values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            anchored = partial & ~np.isnan(first)
+            new_full |= set(df.location[partial & np.isnan(first) & ~np.isnan(values)])
+            df[col] = pd.array(np.where(anchored, days_new - np.nan_to_num(first), values)).astype("Int64")
+        if new_full:
+            full |= new_full
+            df_full = func(df_base[df_base.location.isin(new_full)].copy())
+            df = pd.concat([df[~df.location.isin(new_full)], df_full], ignore_index=True)
+        # Rows before the first change of each location are reused
+        first_change = df_metrics_old.location.map(changes).to_numpy(dtype=float)
+        reused = (np.isnan(first_change) | (days_old < first_change)) & ~df_metrics_old.location.isin(full).to_numpy()
+        df_reused = df_metrics_old[reused]
+        if list(df_reused.columns) != list(df.columns):
+            return None
+        df = pd.concat([df_reused, df], ignore_index=True).sort_values(KEYS).reset_index(drop=True)
+        # Rolling averages of the changed locations, over all their rows (see module docstring)
+        changed = df.location.isin(changes.index)
+        df_rolling = inject_rolling_avg(df.loc[changed, KEYS + [spec["col"] for spec in rolling_avg_spec.values()]])
+        df.loc[df_rolling.index, list(rolling_avg_spec)] = df_rolling[list(rolling_avg_spec)]
+        df.attrs["reused"] = len(df_reused)
+        return df
+
+    @staticmethod
+    def _recompute(df_base, days, changes, full, func):
+        """Derived metrics of the changed rows of each location (all rows for locations in `full`)."""
+        first_change = df_base.location.map(changes).to_numpy(dtype=float)
+        in_full = df_base.location.isin(full).to_numpy()
+        recompute = pd.Series(in_full | (days >= first_change), index=df_base.index)
+        # Previous LOOKBACK rows of each location are used as context
+        position = df_base.groupby("location").cumcount()
+        first_recomputed = position.where(recompute).groupby(df_base.location).transform("min")
+        df = func(df_base[position >= first_recomputed - LOOKBACK].copy())
+        first_change = df.location.map(changes).to_numpy(dtype=float)
+        return df[df.location.isin(full).to_numpy() | (_day_numbers(df.date) >= first_change)]
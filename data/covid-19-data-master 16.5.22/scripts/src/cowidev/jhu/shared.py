@@ -1,18 +1,29 @@
 import pandas as pd
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
 from cowidev.megafile.steps.test import get_testing
 from cowidev import PATHS
+from cowidev.utils.inputs import read_input
 
 
 POPULATION_CSV_PATH = PATHS.INTERNAL_INPUT_UN_POPULATION_FILE
 CONTINENTS_CSV_PATH = PATHS.INTERNAL_INPUT_OWID_CONT_FILE
 WB_INCOME_GROUPS_CSV_PATH = PATHS.INTERNAL_INPUT_WB_INCOME_FILE
 EU_COUNTRIES_CSV_PATH = PATHS.INTERNAL_INPUT_OWID_EU_FILE
+# Temporary files of the JHU pipeline (downloads cache, incremental state, US time series)
+TMP_DIR = os.path.join(PATHS.INTERNAL_TMP_DIR, "jhu")
+TIME_SERIES_URL = (
+    "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series"
+)
 
 ZERO_DAY = "2020-01-21"
+# Bump when a change in the processing code changes the outputs, so that the next run does not reuse the previous one
+# (see `_inputs_signature` in `cowidev.jhu.__main__` and `cowidev.jhu.incremental.JHUState`)
+PIPELINE_VERSION = 1
 zero_day = datetime.strptime(ZERO_DAY, "%Y-%m-%d")
 
 # =========
@@ -32,8 +43,23 @@ def _find_closest_year_row(df, year=2021):
 # ============
 
 
+def time_series_path(metric: str, region: str) -> str:
+    """Local copy of JHU time series `metric` ("confirmed", "deaths") of `region` ("global", "US").
+
+    US time series (by county) are too large to be versioned, so they are kept in the temporary folder.
+    """
+    directory = PATHS.INTERNAL_INPUT_JHU_DIR if region == "global" else TMP_DIR
+    return os.path.join(directory, f"time_series_covid19_{metric}_{region}.csv")
+
+
 def load_population(year=2021):
-    df = pd.read_csv(
+    return _load_population(year).copy()
+
+
+@lru_cache(maxsize=None)
+def _load_population(year):
+    """Population of each location in the year closest to `year` (read once per process)."""
+    df = read_input(
         POPULATION_CSV_PATH,
         keep_default_na=False,
         usecols=["entity", "year", "population"],
@@ -46,7 +72,7 @@ def load_population(year=2021):
 
 
 def load_owid_continents():
-    return pd.read_csv(
+    return read_input(
         CONTINENTS_CSV_PATH,
         keep_default_na=False,
         header=0,
@@ -55,11 +81,14 @@ def load_owid_continents():
     )
 
 
-locations_by_continent = load_owid_continents().groupby("continent")["location"].apply(list).to_dict()
+@lru_cache(maxsize=None)
+def get_locations_by_continent() -> dict:
+    """Locations in each OWID continent (loaded on first use)."""
+    return load_owid_continents().groupby("continent")["location"].apply(list).to_dict()
 
 
 def load_wb_income_groups():
-    return pd.read_csv(
+    return read_input(
         WB_INCOME_GROUPS_CSV_PATH,
         keep_default_na=False,
         header=0,
@@ -69,7 +98,7 @@ def load_wb_income_groups():
 
 
 def load_eu_country_names():
-    df = pd.read_csv(
+    df = read_input(
         EU_COUNTRIES_CSV_PATH,
         keep_default_na=False,
         header=0,
@@ -79,7 +108,10 @@ def load_eu_country_names():
     return df["location"].tolist()
 
 
-locations_by_wb_income_group = load_wb_income_groups().groupby("income_group")["location"].apply(list).to_dict()
+@lru_cache(maxsize=None)
+def get_locations_by_wb_income_group() -> dict:
+    """Locations in each World Bank income group (loaded on first use)."""
+    return load_wb_income_groups().groupby("income_group")["location"].apply(list).to_dict()
 
 
 # ==============
@@ -108,45 +140,74 @@ def inject_per_million(df, measures):
 # OWID continents + custom aggregates
 # ===================================
 
-aggregates_spec = {
-    "World": {"include": None, "exclude": None},
-    "World excl. China": {"exclude": ["China"]},
-    "World excl. China and South Korea": {"exclude": ["China", "South Korea"]},
-    "World excl. China, South Korea, Japan and Singapore": {"exclude": ["China", "South Korea", "Japan", "Singapore"]},
-    # European Union
-    "European Union": {"include": load_eu_country_names()},
-    # OWID continents
-    **{continent: {"include": locations, "exclude": None} for continent, locations in locations_by_continent.items()},
-    # Asia without China
-    "Asia excl. China": {"include": list(set(locations_by_continent["Asia"]) - set(["China"]))},
-    # World Bank income groups
-    **{
-        income_group: {"include": locations, "exclude": None}
-        for income_group, locations in locations_by_wb_income_group.items()
-    },
-}
-
-
-def _sum_aggregate(df, name, include=None, exclude=None):
-    df = df.copy()
-    if include:
-        df = df[df["location"].isin(include)]
-    if exclude:
-        df = df[~df["location"].isin(exclude)]
-    df = df.groupby("date").sum().reset_index()
-    df["location"] = name
-    return df
+@lru_cache(maxsize=None)
+def get_aggregates_spec() -> dict:
+    """Members of each OWID aggregate. Input tables are only read on first use."""
+    locations_by_continent = get_locations_by_continent()
+    return {
+        "World": {"include": None, "exclude": None},
+        "World excl. China": {"exclude": ["China"]},
+        "World excl. China and South Korea": {"exclude": ["China", "South Korea"]},
+        "World excl. China, South Korea, Japan and Singapore": {
+            "exclude": ["China", "South Korea", "Japan", "Singapore"]
+        },
+        # European Union
+        "European Union": {"include": load_eu_country_names()},
+        # OWID continents
+        **{
+            continent: {"include": locations, "exclude": None}
+            for continent, locations in locations_by_continent.items()
+        },
+        # Asia without China
+        "Asia excl. China": {"include": list(set(locations_by_continent["Asia"]) - set(["China"]))},
+        # World Bank income groups
+        **{
+            income_group: {"include": locations, "exclude": None}
+            for income_group, locations in get_locations_by_wb_income_group().items()
+        },
+    }
+
+
+def aggregates_membership(locations, spec: dict = None) -> pd.DataFrame:
+    """Membership matrix of `locations` (rows) in each aggregate in `spec` (columns, defaults to OWID aggregates).
+
+    A location belongs to an aggregate if it is in its `include` list (if given) and not in its `exclude` list.
+    """
+    if spec is None:
+        spec = get_aggregates_spec()
+    locations = pd.Index(locations)
+    membership = {}
+    for name, params in spec.items():
+        member = np.ones(len(locations), dtype=bool)
+        if params.get("include"):
+            member &= locations.isin(params["include"])
+        if params.get("exclude"):
+            member &= ~locations.isin(params["exclude"])
+        membership[name] = member
+    return pd.DataFrame(membership, index=locations)
 
 
 def inject_owid_aggregates(df):
-    return pd.concat(
-        [
-            df,
-            *[_sum_aggregate(df, name, **params) for name, params in aggregates_spec.items()],
-        ],
-        sort=True,
-        ignore_index=True,
-    )
+    """Append the OWID aggregates (see `get_aggregates_spec`), as the sum of their members' values on each date.
+
+    All aggregates are computed at once, multiplying the (date × location) table of each metric by the membership
+    matrix. An aggregate only has rows for dates with at least one row from its members.
+    """
+    columns = df.select_dtypes("number").columns
+    # (date, location) table of each metric (duplicated pairs are summed, missing values count as zero)
+    values = df.groupby(["date", "location"])[list(columns)].sum().unstack("location")
+    # Number of rows of each location on each date
+    presence = df.groupby(["date", "location"]).size().unstack("location", fill_value=0)
+    membership = aggregates_membership(presence.columns).to_numpy(dtype=float)
+    # (date × aggregate) tables
+    counts = presence.to_numpy(dtype=float) @ membership
+    dates, names = presence.index.to_numpy(), np.array(list(get_aggregates_spec()), dtype=object)
+    aggregate_idx, date_idx = np.nonzero(counts.T > 0)
+    aggregates = pd.DataFrame({"date": dates[date_idx], "location": names[aggregate_idx]})
+    for column in columns:
+        sums = values[column].reindex(columns=presence.columns).fillna(0).to_numpy(dtype=float) @ membership
+        aggregates[column] = pd.Series(sums.T[aggregate_idx, date_idx]).astype(df[column].dtype)
+    return pd.concat([df, aggregates], sort=True, ignore_index=True)
 
 
 # =======================
@@ -195,38 +256,29 @@ days_since_spec = {
 }
 
 
-def _get_date_of_threshold(df, col, threshold):
-    try:
-        return df["date"][df[col] >= threshold].iloc[0]
-    except:
-        return None
-
-
-def _date_diff(a, b, positive_only=False):
-    if pd.isnull(a) or pd.isnull(b):
-        return None
-    diff = (a - b).days
-    if positive_only and diff < 0:
-        return None
-    return diff
-
-
-def _days_since(df, spec):
-    ref_date = pd.to_datetime(_get_date_of_threshold(df, spec["value_col"], spec["value_threshold"]))
-    return (
-        pd.to_datetime(df["date"]).map(lambda date: _date_diff(date, ref_date, spec["positive_only"])).astype("Int64")
-    )
-
-
 def inject_days_since(df):
+    """Add the number of days since each location reached the thresholds in `days_since_spec`.
+
+    Dates are converted once to day numbers. For each spec, the position of the first row (within each location)
+    reaching the threshold is found with a single grouped reduction, and days since are obtained by subtraction.
+    """
     df = df.copy()
+    dates = pd.to_datetime(df["date"])
+    days = dates.to_numpy().astype("datetime64[D]").astype(np.int64)
+    invalid_date = dates.isnull().to_numpy()
+    location = df["location"].to_numpy()
+    positions = np.arange(len(df))
     for col, spec in days_since_spec.items():
-        df[col] = (
-            df[["date", "location", spec["value_col"]]]
-            .groupby("location")
-            .apply(lambda df_group: _days_since(df_group, spec))
-            .reset_index(level=0, drop=True)
-        )
+        reached = df[spec["value_col"]].ge(spec["value_threshold"]).fillna(False).to_numpy(dtype=bool)
+        # Position of the first row reaching the threshold in each location (len(df) if never reached)
+        first = pd.Series(np.where(reached, positions, len(df))).groupby(location, sort=False).transform("min")
+        never = (first == len(df)).to_numpy()
+        first = np.where(never, 0, first)
+        diff = days - days[first]
+        missing = never | invalid_date | invalid_date[first]
+        if spec["positive_only"]:
+            missing |= diff < 0
+        df[col] = pd.arrays.IntegerArray(np.where(missing, 0, diff), missing)
     return df
 
 
@@ -235,16 +287,11 @@ def inject_days_since(df):
 # ===================
 
 
-def _apply_row_cfr_100(row):
-    if pd.notnull(row["total_cases"]) and row["total_cases"] >= 100:
-        return row["cfr"]
-    return pd.NA
-
-
 def inject_cfr(df):
     cfr_series = (df["total_deaths"] / df["total_cases"]) * 100
     df["cfr"] = cfr_series.round(decimals=3)
-    df["cfr_100_cases"] = df.apply(_apply_row_cfr_100, axis=1)
+    # CFR only for observations with at least 100 cases
+    df["cfr_100_cases"] = df["cfr"].where(df["total_cases"] >= 100)
     return df
 
 
@@ -307,29 +354,16 @@ def inject_exemplars(df):
     df = inject_population(df)
 
     # Inject days since 100th case IF population ≥ 5M
-    def mapper_days_since(row):
-        if pd.notnull(row["population"]) and row["population"] >= 5e6:
-            return row["days_since_100_total_cases"]
-        return pd.NA
-
-    df["days_since_100_total_cases_and_5m_pop"] = df.apply(mapper_days_since, axis=1)
+    pop_5m = (df["population"] >= 5e6).to_numpy()
+    df["days_since_100_total_cases_and_5m_pop"] = df["days_since_100_total_cases"].where(pop_5m)
 
     # Inject boolean when all exenplar conditions hold
     # Use int because the Grapher doesn't handle non-ints very well
     countries_with_testing_data = set(get_testing()["location"])
-
-    def mapper_bool(row):
-        if (
-            pd.notnull(row["days_since_100_total_cases"])
-            and pd.notnull(row["population"])
-            and row["days_since_100_total_cases"] >= 21
-            and row["population"] >= 5e6
-            and row["location"] in countries_with_testing_data
-        ):
-            return 1
-        return 0
-
-    df["5m_pop_and_21_days_since_100_cases_and_testing"] = df.apply(mapper_bool, axis=1)
+    days_21 = df["days_since_100_total_cases"].ge(21).fillna(False).to_numpy(dtype=bool)
+    df["5m_pop_and_21_days_since_100_cases_and_testing"] = (
+        pop_5m & days_21 & df["location"].isin(countries_with_testing_data).to_numpy()
+    ).astype(int)
 
     return drop_population(df)
 
@@ -359,23 +393,35 @@ doubling_days_spec = {
 
 
 def pct_change_to_doubling_days(pct_change, periods):
-    if pd.notnull(pct_change) and pct_change != 0:
-        doubling_days = periods * np.log(2) / np.log(1 + pct_change)
-        return np.round(doubling_days, decimals=2)
-    return pd.NA
+    """Doubling days from percentage change(s) over `periods` days. NaN if the change is missing or zero."""
+    pct_change = np.asarray(pct_change, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        doubling_days = np.round(periods * np.log(2) / np.log(1 + pct_change), decimals=2)
+    return np.where(pct_change == 0, np.nan, doubling_days)
 
 
 def inject_doubling_days(df):
+    """Add doubling days columns in `doubling_days_spec`. Zero totals are ignored (as if missing).
+
+    Rows are grouped by location once, and each spec is computed on the location-sorted arrays: the value `periods`
+    rows before (within the same location) is found by position.
+    """
+    location, _ = pd.factorize(df["location"])
+    # Rows of each location become contiguous, keeping their order
+    order = np.argsort(location, kind="stable")
+    location = location[order]
+    columns = {}
     for col, spec in doubling_days_spec.items():
-        value_col = spec["value_col"]
         periods = spec["periods"]
-        df.loc[df[value_col] == 0, value_col] = np.nan
-        df[col] = (
-            df.groupby("location", as_index=False)[value_col]
-            .pct_change(periods=periods, fill_method=None)[value_col]
-            .map(lambda pct: pct_change_to_doubling_days(pct, periods))
-        )
-    return df
+        values = df[spec["value_col"]].to_numpy(dtype=float, na_value=np.nan)[order]
+        values[values == 0] = np.nan
+        previous = np.full(len(values), np.nan)
+        same_location = location[periods:] == location[:-periods]
+        previous[periods:] = np.where(same_location, values[:-periods], np.nan)
+        doubling_days = np.empty(len(values))
+        doubling_days[order] = pct_change_to_doubling_days(values / previous - 1, periods)
+        columns[col] = doubling_days
+    return df.assign(**columns)
 
 
 # ====================================
@@ -401,7 +447,7 @@ def _inject_growth(df, prefix, periods):
         .groupby("location")[[cases_colname, deaths_colname]]
         .pct_change(periods=periods, fill_method=None)
         .round(3)
-        .replace([np.inf, -np.inf], pd.NA)
+        .replace([np.inf, -np.inf], np.nan)
         * 100
     )
 
@@ -508,20 +554,25 @@ def existsin(l1, l2):
     return [x for x in l1 if x in l2]
 
 
+def _export_pivot(df_wide, col_name, output_path):
+    """Export the (date × location) table of measure `col_name`, with World as first column."""
+    df_pivot = df_wide[col_name]
+    cols = df_pivot.columns.tolist()
+    cols.insert(0, cols.pop(cols.index("World")))
+    df_pivot[cols].to_csv(os.path.join(output_path, "%s.csv" % col_name))
+
+
 def standard_export(df, output_path, grapher_name):
     # Grapher
-    df_grapher = df.copy()
-    df_grapher["date"] = pd.to_datetime(df_grapher["date"]).map(lambda date: (date - zero_day).days)
-    df_grapher = (
-        df_grapher[GRAPHER_COL_NAMES.keys()]
-        .rename(columns=GRAPHER_COL_NAMES)
-        .to_csv(os.path.join(output_path, "%s.csv" % grapher_name), index=False)
+    df_grapher = df[GRAPHER_COL_NAMES.keys()].assign(date=(pd.to_datetime(df["date"]) - zero_day).dt.days)
+    df_grapher.rename(columns=GRAPHER_COL_NAMES).to_csv(
+        os.path.join(output_path, "%s.csv" % grapher_name), index=False
     )
 
     # Table & public extracts for external users
     # Excludes aggregates
     excluded_aggregates = list(
-        set(aggregates_spec.keys())
+        set(get_aggregates_spec().keys())
         - set(
             [
                 "World",
@@ -546,10 +597,9 @@ def standard_export(df, output_path, grapher_name):
         os.path.join(output_path, "full_data.csv"), index=False
     )
     # Pivot variables (wide format)
-    for col_name in [*BASE_MEASURES, *PER_MILLION_MEASURES]:
-        df_pivot = df_table.pivot(index="date", columns="location", values=col_name)
-        # move World to first column
-        cols = df_pivot.columns.tolist()
-        cols.insert(0, cols.pop(cols.index("World")))
-        df_pivot[cols].to_csv(os.path.join(output_path, "%s.csv" % col_name))
+    # All measures are reshaped at once (columns: measure × location), then each table is written from a slice
+    measures = [*BASE_MEASURES, *PER_MILLION_MEASURES]
+    df_wide = df_table.set_index(["date", "location"])[measures].unstack("location")
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(lambda col_name: _export_pivot(df_wide, col_name, output_path), measures))
     return True
@@ -0,0 +1,186 @@
+"""Subnational cases and deaths, from the JHU time series of provinces/states (global) and counties (US).
+
+Time series are read in chunks of rows and only kept in their wide form (one row per region, one column per date), as
+NumPy matrices. Daily counts and 7-day averages are computed on these matrices, and the long-format CSV is written to
+the zip archive in chunks of regions, so that the long table (tens of millions of rows) is never built in memory.
+
+Memory is bounded by the wide matrices, i.e. O(regions x dates): one float64 matrix per time series (about 25 MB for
+the ~3,300 US counties over ~1,000 dates), plus the daily and smoothed values of a single chunk of regions at a time.
+"""
+import io
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from cowidev.jhu.shared import time_series_path
+from cowidev.utils.s3 import S3
+
+
+FILENAME = "subnational_cases_deaths"
+S3_PATH = f"s3://covid-19/public/jhu/{FILENAME}.zip"
+
+KEYS = ["location1", "location2", "location3"]
+METRICS = {"cases": "confirmed", "deaths": "deaths"}
+VALUE_COLUMNS = [
+    "total_cases",
+    "new_cases",
+    "new_cases_smoothed",
+    "total_deaths",
+    "new_deaths",
+    "new_deaths_smoothed",
+]
+# Region columns of each time series (renamed to KEYS), and values of the KEYS they don't have
+SOURCES = {
+    "global": {
+        "keys": {"Country/Region": "location1", "Province/State": "location2"},
+        "constants": {"location3": pd.NA},
+        # National rows are not subnational data
+        "dropna": ["Province/State"],
+    },
+    "US": {
+        "keys": {"Province_State": "location2", "Admin2": "location3"},
+        "constants": {"location1": "United States"},
+        "dropna": [],
+    },
+}
+SMOOTHING_WINDOW = 7
+# Regions per chunk, when reading time series and when writing the output
+READ_CHUNK_SIZE = 500
+WRITE_CHUNK_SIZE = 250
+
+
+@dataclass
+class TimeSeries:
+    """Wide time series of a metric: `values[i, j]` is the value of region `keys.iloc[i]` on `dates[j]`."""
+
+    keys: pd.DataFrame
+    dates: pd.Index
+    values: np.ndarray
+    # True if all values are integers (i.e. they are exported as such)
+    integer: bool
+
+
+def read_time_series(source: str, keys: dict, constants: dict, dropna: list) -> TimeSeries:
+    """Read the wide time series CSV `source` in chunks of rows."""
+    chunks_keys, chunks_values, integer = [], [], True
+    for chunk in pd.read_csv(source, na_values="", chunksize=READ_CHUNK_SIZE):
+        chunk = chunk.dropna(subset=dropna)
+        dates = pd.to_datetime(chunk.columns, format="%m/%d/%y", errors="coerce")
+        date_columns = chunk.columns[dates.notnull()]
+        integer &= all(pd.api.types.is_integer_dtype(dtype) for dtype in chunk.dtypes[date_columns])
+        chunks_keys.append(chunk[list(keys)].rename(columns=keys))
+        chunks_values.append(chunk[date_columns].to_numpy(dtype=float))
+    # Dates in chronological order
+    dates = dates[dates.notnull()]
+    order = np.argsort(dates.to_numpy(), kind="stable")
+    df_keys = pd.concat(chunks_keys, ignore_index=True).assign(**constants)[KEYS]
+    values = np.concatenate(chunks_values)
+    del chunks_values
+    # Columns are only reordered (i.e. copied) if needed
+    if (order != np.arange(len(order))).any():
+        values = values[:, order]
+    return TimeSeries(
+        keys=df_keys,
+        dates=pd.Index(dates[order].strftime("%Y-%m-%d")),
+        values=values,
+        integer=integer,
+    )
+
+
+def _key_index(df_keys: pd.DataFrame) -> pd.MultiIndex:
+    return pd.MultiIndex.from_frame(df_keys.fillna(""))
+
+
+def align_regions(series: TimeSeries, df_keys: pd.DataFrame) -> TimeSeries:
+    """Rows of `series` for the regions in `df_keys` (NaN for missing regions)."""
+    rows = _key_index(series.keys).get_indexer(_key_index(df_keys))
+    values = series.values[rows]
+    values[rows == -1] = np.nan
+    return TimeSeries(df_keys, series.dates, values, series.integer and (rows != -1).all())
+
+
+def daily_values(totals: np.ndarray) -> tuple:
+    """Daily values and their 7-day average, from cumulative `totals` (one row per region)."""
+    new = np.full_like(totals, np.nan)
+    new[:, 1:] = np.diff(totals, axis=1)
+    smoothed = np.full_like(totals, np.nan)
+    if totals.shape[1] >= SMOOTHING_WINDOW:
+        windows = sliding_window_view(new, SMOOTHING_WINDOW, axis=1)
+        smoothed[:, SMOOTHING_WINDOW - 1 :] = windows.mean(axis=-1).round(2)
+    return new, smoothed
+
+
+def load_region(region: str) -> dict:
+    """Cases and deaths time series of `region` ("global" or "US"), for the regions with cases data.
+
+    Time series are read from their local copies (see `cowidev.jhu.__main__.download_csv`).
+    """
+    spec = SOURCES[region]
+    series = {
+        metric: read_time_series(time_series_path(name, region), **spec)
+        for metric, name in METRICS.items()
+    }
+    # Regions without cases are not exported
+    return {metric: align_regions(s, series["cases"].keys) for metric, s in series.items()}
+
+
+def _chunk_rows(regions: pd.DataFrame, sources: list, dates: pd.Index, integer: dict) -> pd.DataFrame:
+    """Long-format rows (with positive total cases) of a chunk of `regions` (sorted)."""
+    values = {column: np.full((len(regions), len(dates)), np.nan) for column in VALUE_COLUMNS}
+    for source_id, source in enumerate(sources):
+        positions = np.flatnonzero(regions._source.to_numpy() == source_id)
+        rows = regions._row.to_numpy()[positions]
+        for metric, series in source.items():
+            columns = dates.get_indexer(series.dates)
+            totals = series.values[rows]
+            new, smoothed = daily_values(totals)
+            values[f"total_{metric}"][np.ix_(positions, columns)] = totals
+            values[f"new_{metric}"][np.ix_(positions, columns)] = new
+            values[f"new_{metric}_smoothed"][np.ix_(positions, columns)] = smoothed
+    # Only rows with cases are exported
+    region_index, date_index = np.nonzero(values["total_cases"] > 0)
+    df = regions[KEYS].iloc[region_index].reset_index(drop=True)
+    df["date"] = dates[date_index]
+    for column, matrix in values.items():
+        df[column] = matrix[region_index, date_index]
+        if integer.get(column):
+            df[column] = df[column].astype(np.int64)
+    return df
+
+
+def write_subnational(sources: list, path: str):
+    """Write all regions of `sources` (outputs of `load_region`) as a zipped CSV, in chunks of regions."""
+    # Regions of all sources, sorted, with the position of their data
+    regions = pd.concat(
+        [
+            source["cases"].keys.assign(_source=source_id, _row=np.arange(len(source["cases"].keys)))
+            for source_id, source in enumerate(sources)
+        ],
+        ignore_index=True,
+    ).sort_values(KEYS, kind="stable")
+    dates = pd.Index(sorted(set().union(*(series.dates for source in sources for series in source.values()))))
+    # Totals are integers if they are integers in all sources and have no missing dates
+    integer = {
+        f"total_{metric}": all(
+            source[metric].integer and source["cases"].dates.isin(source[metric].dates).all() for source in sources
+        )
+        for metric in METRICS
+    }
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with io.TextIOWrapper(zf.open(f"{FILENAME}.csv", "w", force_zip64=True), encoding="utf-8", newline="") as f:
+            for start in range(0, len(regions), WRITE_CHUNK_SIZE):
+                df = _chunk_rows(regions.iloc[start : start + WRITE_CHUNK_SIZE], sources, dates, integer)
+                df.to_csv(f, index=False, header=start == 0)
+
+
+def create_subnational():
+    sources = [load_region(region) for region in SOURCES]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, f"{FILENAME}.zip")
+        write_subnational(sources, output_path)
+        S3().upload_to_s3(output_path, S3_PATH, public=True)
@@ -0,0 +1,118 @@
+"""Cache of intermediate megafile results, used by the incremental mode of `generate_megafile`.
+
+Each step output is stored as a pickle, together with the signature (content hash) of the files it was built from. A
+step is only recomputed if the content of any of its input files changed since the previous run. Steps that filter by
+the current date (`date_dependent`) are also recomputed when the day changes. Inputs that live in remote locations
+(URLs, S3) can't be signed cheaply, so their steps are always recomputed.
+
+Besides, the cache keeps a content hash of each step output, so that the megafile can tell which steps actually
+produced different data than in the previous run (`StepCache.changed`).
+"""
+import hashlib
+import json
+import os
+from datetime import date
+
+import pandas as pd
+
+from cowidev import PATHS
+
+
+CACHE_DIR = os.path.join(PATHS.INTERNAL_TMP_DIR, "megafile")
+
+
+def _file_signature(path: str, chunk_size: int = 1024 * 1024):
+    if path.startswith(("http://", "https://", "s3://")):
+        return None
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_frame(df: pd.DataFrame) -> str:
+    """Content hash of a dataframe (column names and values, index excluded)."""
+    h = hashlib.md5(",".join(map(str, df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+class StepCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.changed = set()
+        self._state_path = os.path.join(cache_dir, "state.json")
+        self._state = {}
+        if enabled and os.path.isfile(self._state_path):
+            with open(self._state_path, "r") as f:
+                self._state = json.load(f)
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.pkl")
+
+    def load(self, name: str, inputs: list, func, date_dependent: bool = False, **kwargs) -> pd.DataFrame:
+        """Get the output of step `name`, i.e. `func(**kwargs)`, reusing the cached one if `inputs` did not change.
+
+        Outputs of `date_dependent` steps (i.e. filtering by the current date) are only reused within the same day.
+        """
+        if not self.enabled:
+            return func(**kwargs)
+        signature = {path: _file_signature(path) for path in inputs}
+        cacheable = all(s is not None for s in signature.values())
+        if date_dependent:
+            signature["date"] = str(date.today())
+        entry = self._state.get(name, {})
+        if cacheable and entry.get("inputs") == signature and os.path.isfile(self._path(name)):
+            return pd.read_pickle(self._path(name))
+        df = func(**kwargs)
+        self.update(name, df, signature)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df.to_pickle(self._path(name))
+        return df
+
+    def update(self, name: str, df: pd.DataFrame, signature: dict = None) -> bool:
+        """Register new content for `name`. Returns True if it differs from the one of the previous run."""
+        if not self.enabled:
+            return True
+        content_hash = hash_frame(df)
+        changed = self._state.get(name, {}).get("hash") != content_hash
+        if changed:
+            self.changed.add(name)
+        self._state[name] = {"inputs": signature, "hash": content_hash}
+        return changed
+
+    def check(self, name: str, inputs: list) -> bool:
+        """Register the current state of static `inputs` (not tied to any step output). Returns True if changed."""
+        if not self.enabled:
+            return True
+        return self.check_signature(name, {path: _file_signature(path) for path in inputs})
+
+    def check_signature(self, name: str, signature: dict) -> bool:
+        """Register `signature` (JSON-serializable) for `name`. Returns True if it changed since the previous run."""
+        if not self.enabled:
+            return True
+        changed = self._state.get(name, {}).get("inputs") != signature
+        if changed:
+            self.changed.add(name)
+        self._state[name] = {"inputs": signature}
+        return changed
+
+    def is_unchanged(self, name: str, df: pd.DataFrame) -> bool:
+        """Check whether `df` is identical to the content registered for `name` in the previous run."""
+        if not self.enabled:
+            return False
+        return not self.update(name, df)
+
+    @property
+    def up_to_date(self) -> bool:
+        """True if no input changed since the previous run."""
+        return self.enabled and not self.changed
+
+    def save(self):
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._state_path, "w") as f:
+            json.dump(self._state, f, indent=2)
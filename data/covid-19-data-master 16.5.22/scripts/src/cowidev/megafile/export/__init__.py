@@ -1,15 +1,18 @@
-from cowidev.megafile.export.public import create_latest, create_dataset
+from cowidev.megafile.export.public import create_latest, create_dataset, latest_window_start
 from cowidev.megafile.export.internal import create_internal
 from cowidev.megafile.export.readme import generate_readme
 from cowidev.megafile.export.status import generate_status
 from cowidev.megafile.export.html import generate_htmls
+from cowidev.megafile.export.shards import create_shards
 
 
 __all__ = [
     "create_latest",
+    "latest_window_start",
     "create_dataset",
     "create_internal",
     "generate_readme",
     "generate_status",
     "generate_htmls",
+    "create_shards",
 ]
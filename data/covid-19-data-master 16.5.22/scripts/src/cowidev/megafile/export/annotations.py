@@ -1,6 +1,9 @@
 import yaml
+import numpy as np
 import pandas as pd
 
+from cowidev.megafile.schema import restore_column
+
 
 class AnnotatorInternal:
     """Adds annotations column.
@@ -92,8 +95,7 @@ class AnnotatorInternal:
         df_config = df_config.drop_duplicates()
         return self.config_flat_to_nested(df_config)
 
-    def insert_annotation(self, stream: str, annotation: dict):
-        # Checks
+    def _check_annotation(self, annotation: dict):
         if "annotation_text" not in annotation or "location" not in annotation or "date" not in annotation:
             raise ValueError("annotation dictionary must contain fields `annotation_text`, `location` and `date`")
         if not (
@@ -104,8 +106,18 @@ class AnnotatorInternal:
             raise ValueError(
                 f"Check `annotation` field types. `annotation_text` (str), `location` (list) and `date` (str)"
             )
-        # Add annotation
-        self._config[stream].append(annotation)
+
+    def insert_annotation(self, stream: str, annotation: dict):
+        self.insert_annotations(stream, [annotation])
+
+    def insert_annotations(self, stream: str, annotations: list):
+        """Insert several annotations at once (duplicates are removed only once, after all insertions)."""
+        for annotation in annotations:
+            self._check_annotation(annotation)
+        if not annotations:
+            return
+        # Add annotations
+        self._config[stream].extend(annotations)
         # Remove duplicates
         self._config = self._remove_config_duplicates()
 
@@ -118,32 +130,60 @@ class AnnotatorInternal:
             return self._add_annotations(df, stream)
         return df
 
-    def _add_annotations(self, df: pd.DataFrame, stream: str) -> pd.DataFrame:
-        df = df.assign(annotations=pd.NA)
-        conf = self.config[stream]
-        for c in conf:
+    def _annotation_table(self, stream: str) -> pd.DataFrame:
+        """Flatten the annotations of `stream` into a table with one row per location and start date.
+
+        Rows keep the order of `config`, i.e. sorted by date, so that later annotations take precedence.
+        """
+        records = []
+        for c in self.config[stream]:
             if not ("location" in c and "annotation_text" in c):
                 raise ValueError(f"Missing field in {stream} (`location` and `annotation_text` are required).")
-            if isinstance(c["location"], str):
-                mask = df.location == c["location"]
-            elif isinstance(c["location"], list):
-                mask = df.location.isin(c["location"])
-            if "date" in c:
-                mask = mask & (df.date >= c["date"])
-            df.loc[mask, "annotations"] = c["annotation_text"]
+            locations = [c["location"]] if isinstance(c["location"], str) else c["location"]
+            date = str(c["date"]) if "date" in c else ""
+            records.extend((loc, date, c["annotation_text"]) for loc in locations)
+        return pd.DataFrame.from_records(records, columns=["location", "date", "annotation_text"])
+
+    def _add_annotations(self, df: pd.DataFrame, stream: str) -> pd.DataFrame:
+        """Add column `annotations` with the text of the latest annotation that started on or before each row's date.
+
+        Rows and annotations are encoded as (location, date) integer keys, and each row is matched to its annotation
+        with a single `searchsorted` over the sorted annotation keys.
+        """
+        table = self._annotation_table(stream)
+        annotations = np.full(len(df), pd.NA, dtype=object)
+        if not table.empty:
+            locations = pd.Index(table.location.unique())
+            dates = pd.Index(sorted(set(table.date) | set(df.date.unique())))
+            table_location = locations.get_indexer(table.location)
+            table_keys = table_location * len(dates) + dates.get_indexer(table.date)
+            order = np.argsort(table_keys, kind="stable")
+            table_location, table_keys = table_location[order], table_keys[order]
+            texts = table.annotation_text.to_numpy()[order]
+            # Rows from locations without annotations get negative keys, and hence are not matched
+            df_location = locations.get_indexer(df.location)
+            df_keys = df_location * len(dates) + dates.get_indexer(df.date)
+            idx = np.searchsorted(table_keys, df_keys, side="right") - 1
+            matched = (idx >= 0) & (df_location >= 0) & (table_location[idx.clip(0)] == df_location)
+            annotations[matched] = texts[idx[matched]]
+        df = df.copy(deep=False)
+        df["annotations"] = annotations
         return df
 
 
 def add_annotations_countries_100_percentage(df, annotator):
     threshold_perc = 100
-    locations_exc = df[df.people_vaccinated_per_hundred > threshold_perc].groupby("location").date.min().to_dict()
-    for loc, dt in locations_exc.items():
-        annotator.insert_annotation(
-            "vaccinations",
+    msk = restore_column(df.people_vaccinated_per_hundred) > threshold_perc
+    locations_exc = df[msk].groupby("location", observed=True).date.min().to_dict()
+    annotator.insert_annotations(
+        "vaccinations",
+        [
             {
                 "annotation_text": "Exceeds 100% due to vaccination of non-residents",
                 "location": [loc],
                 "date": dt,
-            },
-        )
+            }
+            for loc, dt in locations_exc.items()
+        ],
+    )
     return annotator
@@ -13,17 +13,22 @@ def pipe_vax_locations_to_html(df: pd.DataFrame) -> pd.DataFrame:
     }
     faq = ' (see <a href="https://ourworldindata.org/covid-vaccinations#frequently-asked-questions">FAQ</a>)'
     codes = [i for i in df.iso_code.tolist() if "OWID_" not in i or i == "OWID_KOS"]
-    df = df.assign(
-        location=(df.location.apply(lambda x: f"<td><strong>{x}</strong>{faq if x in country_faqs else ''}</td>")),
-        source=('<td><a href="' + df.source_website + '">' + df.source_name + "</a></td>"),
-        last_observation_date=(
-            pd.to_datetime(df.last_observation_date).apply(lambda x: f"<td>{x.strftime('%b. %e, %Y')}</td>")
-        ),
-        vaccines=(df.vaccines.apply(lambda x: f"<td>{x}</td>")),
-    )[["location", "source", "last_observation_date", "vaccines"]]
-    df.columns = [col.capitalize().replace("_", " ") for col in df.columns]
-    body = ("<tr>" + df.sum(axis=1) + "</tr>").sum(axis=0)
-    header = "<tr>" + "".join(f"<th>{col}</th>" for col in df.columns) + "</tr>"
+    # Cells are built with vectorized string operations
+    cells = pd.DataFrame(
+        {
+            "Location": (
+                "<td><strong>" + df.location + "</strong>" + df.location.isin(country_faqs).map({True: faq, False: ""})
+            )
+            + "</td>",
+            "Source": '<td><a href="' + df.source_website + '">' + df.source_name + "</a></td>",
+            "Last observation date": (
+                "<td>" + pd.to_datetime(df.last_observation_date).dt.strftime("%b. %e, %Y") + "</td>"
+            ),
+            "Vaccines": "<td>" + df.vaccines.astype(str) + "</td>",
+        }
+    )
+    body = "".join("<tr>" + cells.sum(axis=1) + "</tr>")
+    header = "<tr>" + "".join(f"<th>{col}</th>" for col in cells.columns) + "</tr>"
     html_table = f"<table><tbody>{header}{body}</tbody></table>"
     coverage_info = f"Vaccination against COVID-19 has now started in {len(codes)} locations."
     html_table = (f'<p><strong>{coverage_info}</strong></p><div class="tableContainer">{html_table}</div>\n').replace(
@@ -32,9 +37,12 @@ def pipe_vax_locations_to_html(df: pd.DataFrame) -> pd.DataFrame:
     return html_table
 
 
-def generate_htmls():
+def generate_htmls(df_locations: pd.DataFrame):
+    """Generate HTML aux tables.
+
+    `df_locations` is the vaccination locations metadata (see `cowidev.megafile.generate.generate_megafile`).
+    """
     # Vaccinations html source table
-    df = pd.read_csv(PATHS.DATA_VAX_META_FILE)
-    html_table = pipe_vax_locations_to_html(df)
+    html_table = pipe_vax_locations_to_html(df_locations)
     with open(PATHS.DATA_INTERNAL_VAX_TABLE, "w") as f:
         f.write(html_table)
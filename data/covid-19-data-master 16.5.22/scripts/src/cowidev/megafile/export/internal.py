@@ -3,7 +3,9 @@ import os
 import pandas as pd
 import numpy as np
 
+from cowidev.megafile.cache import StepCache
 from cowidev.megafile.export.annotations import AnnotatorInternal, add_annotations_countries_100_percentage
+from cowidev.megafile.schema import restore_column, restore_dtypes, sort_by_location_date
 from cowidev.utils.utils import dict_to_compact_json
 
 
@@ -207,7 +209,9 @@ internal_files_columns = {
 }
 
 
-def create_internal(df: pd.DataFrame, output_dir: str, annotations_path: str, country_data: str, logger):
+def create_internal(
+    df: pd.DataFrame, output_dir: str, annotations_path: str, country_data: str, logger, cache: StepCache = None
+):
     # Ensure internal/ dir is created
     os.makedirs(output_dir, exist_ok=True)
 
@@ -218,26 +222,29 @@ def create_internal(df: pd.DataFrame, output_dir: str, annotations_path: str, co
     # Load annotations
     annotator = AnnotatorInternal.from_yaml(annotations_path, logger)
 
-    # Copy df
-    df = df.copy()
+    # Shallow copy (new columns are not added to the caller's frame, existing ones are not copied)
+    df = sort_by_location_date(df).copy(deep=False)
 
     # Add new annotations for countries having >100% per-capita metric values (runtime, not stored in ANNOTATIONS_PATH)
     annotator = add_annotations_countries_100_percentage(df, annotator)
     # Insert CFR column to avoid calculating it on the client, and enable
     # splitting up into cases & deaths columns.
-    df["cfr"] = (df["total_deaths"] * 100 / df["total_cases"]).round(3)
+    df["cfr"] = (restore_column(df["total_deaths"]) * 100 / restore_column(df["total_cases"])).round(3)
 
     # Insert short-term CFR
     cfr_day_shift = 10  # We compute number of deaths divided by number of cases `cfr_day_shift` days before.
-    shifted_cases = df.sort_values("date").groupby("location")["new_cases_smoothed"].shift(cfr_day_shift)
-    df["cfr_short_term"] = (
-        df["new_deaths_smoothed"].div(shifted_cases).replace(np.inf, np.nan).replace(-np.inf, np.nan).mul(100).round(4)
+    shifted_cases = _shift_by_location(df, "new_cases_smoothed", cfr_day_shift)
+    cfr_short_term = (
+        restore_column(df["new_deaths_smoothed"])
+        .div(shifted_cases)
+        .replace(np.inf, np.nan)
+        .replace(-np.inf, np.nan)
+        .mul(100)
+        .round(4)
+    )
+    df["cfr_short_term"] = cfr_short_term.mask(
+        (cfr_short_term < 0) | (cfr_short_term > 10) | (df.date.astype(str) < "2020-09-01")
     )
-
-    df.loc[
-        (df.cfr_short_term < 0) | (df.cfr_short_term > 10) | (df.date.astype(str) < "2020-09-01"),
-        "cfr_short_term",
-    ] = pd.NA
 
     # Add partly vaccinated
     df = df.pipe(add_partially_vaccinated, country_data)
@@ -248,57 +255,84 @@ def create_internal(df: pd.DataFrame, output_dir: str, annotations_path: str, co
     for name, config in internal_files_columns.items():
         output_path = os.path.join(output_dir, f"megafile--{name}.json")
         value_columns = list(set(config["columns"]) - set(non_value_columns))
-        df_output = df[config["columns"]]
         if name == "vaccinations-boosters":
-            df_output = df_output.copy().pipe(fillna_boosters_till_valid)
-        df_output = df_output.dropna(subset=value_columns, how=config["dropna"])
-        df_output = annotator.add_annotations(df_output, name)
+            df_output = df[config["columns"]].pipe(fillna_boosters_till_valid)
+            df_output = df_output.dropna(subset=value_columns, how=config["dropna"])
+        else:
+            # Equivalent to dropna(subset=value_columns, how=...), but only the kept rows of the projected columns
+            # are copied
+            not_null = df[value_columns].notnull()
+            keep = not_null.any(axis=1) if config["dropna"] == "all" else not_null.all(axis=1)
+            df_output = df.loc[keep, config["columns"]]
+        # Original dtypes (see `cowidev.megafile.schema`) of the exported columns only
+        df_output = annotator.add_annotations(restore_dtypes(df_output), name)
+        # Skip files whose content did not change since the previous (incremental) run
+        if cache is not None and os.path.isfile(output_path) and cache.is_unchanged(f"internal--{name}", df_output):
+            logger.info(f"Skipping {output_path} (unchanged)")
+            continue
         df_to_columnar_json(df_output, output_path)
 
 
+def _shift_by_location(df: pd.DataFrame, column: str, periods: int) -> np.ndarray:
+    """Equivalent to `df.groupby("location")[column].shift(periods)`, for a frame sorted by location and date."""
+    values = restore_column(df[column]).to_numpy(dtype=float)
+    location = df.location.to_numpy()
+    shifted = np.full(len(values), np.nan)
+    shifted[periods:] = np.where(location[periods:] == location[:-periods], values[:-periods], np.nan)
+    return shifted
+
+
 def add_partially_vaccinated(df: pd.DataFrame, country_data: str):
+    df = df.copy(deep=False)
+    df["people_partly_vaccinated"] = restore_column(df.people_vaccinated) - restore_column(df.people_fully_vaccinated)
     # Countries that already have partially vaxxed metric
-    df_a = df[df.location.isin(COUNTRIES_WITH_PARTLY_VAX_METRIC)]
-    for filename in country_vax_data_partly(country_data):
-        if not os.path.isfile(filename):
-            raise ValueError(f"Invalid file path! {filename}")
-        try:
-            x = pd.read_csv(filename, usecols=["location", "date", "people_partly_vaccinated"])
-        except ValueError as e:
-            raise ValueError(f"{filename}: {e}")
-        df_a = df_a.merge(x, on=["location", "date"], how="outer")
-    df_b = df[~df.location.isin(COUNTRIES_WITH_PARTLY_VAX_METRIC)]
-    df_b.loc[:, "people_partly_vaccinated"] = df_b.people_vaccinated - df_b.people_fully_vaccinated
-    df = pd.concat([df_a, df_b], ignore_index=True).sort_values(["location", "date"])
-    df.loc[:, "people_partly_vaccinated_per_hundred"] = df["people_partly_vaccinated"] / df["population"] * 100
-    df.loc[df.location == "United States", "people_partly_vaccinated_per_hundred"] = (
-        df["people_partly_vaccinated"] / 336324782 * 100
-    )
+    if COUNTRIES_WITH_PARTLY_VAX_METRIC:
+        msk = df.location.isin(COUNTRIES_WITH_PARTLY_VAX_METRIC)
+        df_a = df[msk].drop(columns=["people_partly_vaccinated"])
+        for filename in country_vax_data_partly(country_data):
+            if not os.path.isfile(filename):
+                raise ValueError(f"Invalid file path! {filename}")
+            try:
+                x = pd.read_csv(filename, usecols=["location", "date", "people_partly_vaccinated"])
+            except ValueError as e:
+                raise ValueError(f"{filename}: {e}")
+            df_a = df_a.merge(x, on=["location", "date"], how="outer")
+        df = pd.concat([df_a, df[~msk]], ignore_index=True).sort_values(["location", "date"])
+    population = restore_column(df["population"])
+    df["people_partly_vaccinated_per_hundred"] = df["people_partly_vaccinated"] / population * 100
+    msk = df.location == "United States"
+    df.loc[msk, "people_partly_vaccinated_per_hundred"] = df.loc[msk, "people_partly_vaccinated"] / 336324782 * 100
     return df
 
 
 def add_fully_vaccinated_no_boosters(df):
     return df.assign(
-        people_fully_vaccinated_no_booster=df.people_fully_vaccinated - df.total_boosters.fillna(0),
+        people_fully_vaccinated_no_booster=(
+            restore_column(df.people_fully_vaccinated) - restore_column(df.total_boosters).fillna(0)
+        ),
         people_fully_vaccinated_no_booster_per_hundred=(
-            df.people_fully_vaccinated_per_hundred - df.total_boosters_per_hundred.fillna(0)
+            restore_column(df.people_fully_vaccinated_per_hundred)
+            - restore_column(df.total_boosters_per_hundred).fillna(0)
         ),
     )
 
 
 def add_total_vaccinations_no_boosters(df):
-    return df.assign(
-        total_vaccinations_no_boosters=df.total_vaccinations - df.total_boosters.fillna(0),
-        total_vaccinations_no_boosters_per_hundred=(
-            df.total_vaccinations_per_hundred - df.total_boosters_per_hundred.fillna(0)
-        ),
-    )
+    # Shallow copy: unlike `df.assign`, existing columns are not copied
+    df = df.copy(deep=False)
+    df["total_vaccinations_no_boosters"] = restore_column(df.total_vaccinations) - restore_column(
+        df.total_boosters
+    ).fillna(0)
+    df["total_vaccinations_no_boosters_per_hundred"] = restore_column(
+        df.total_vaccinations_per_hundred
+    ) - restore_column(df.total_boosters_per_hundred).fillna(0)
+    return df
 
 
 def fillna_boosters_till_valid(df):
     # Fill NaNs in total_boosters (only up to first valid value)
     df = df.sort_values(["location", "date"])
-    msk = df.groupby(["location"]).total_boosters.ffill().isna()
+    msk = df.groupby(["location"], observed=True).total_boosters.ffill().isna()
     df.loc[msk, ["total_boosters", "total_boosters_per_hundred"]] = 0
     return df
 
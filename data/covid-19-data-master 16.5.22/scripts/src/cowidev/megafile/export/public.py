@@ -1,41 +1,77 @@
 import os
-from datetime import date, timedelta
+import tempfile
+from datetime import date, datetime, timedelta
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from cowidev import PATHS
-from cowidev.utils.s3 import S3, obj_to_s3
+from cowidev.megafile.export.stage import ExportArtifact, run_export_stage
+from cowidev.megafile.schema import restore_dtypes
 from cowidev.utils.utils import dict_to_compact_json
 
 
 DATA_DIR = PATHS.DATA_DIR
+# Fixed XLSX creation date, so that the file content (and hence its hash) only depends on the data
+XLSX_CREATED = datetime(2020, 1, 1)
+
+
+def latest_window_start() -> str:
+    """First date of the data points considered by `create_latest`."""
+    return str(date.today() - timedelta(weeks=2))
 
 
 def create_dataset(df, macro_variables, logger):
-    """Export dataset as CSV, XLSX and JSON (complete time series)."""
-    logger.info("Writing to CSV…")
-    filename = os.path.join(DATA_DIR, "owid-covid-data.csv")
-    df.to_csv(filename, index=False)
-    S3().upload_to_s3(filename, "s3://covid-19/public/owid-covid-data.csv", public=True)
-
-    logger.info("Writing to XLSX…")
-    # filename = os.path.join(DATA_DIR, "owid-covid-data.xlsx")
-    # all_covid.to_excel(os.path.join(DATA_DIR, "owid-covid-data.xlsx"), index=False, engine="xlsxwriter")
-    # upload_to_s3(filename, "public/owid-covid-data.xlsx", public=True)
-    obj_to_s3(df, s3_path="s3://covid-19/public/owid-covid-data.xlsx", public=True)
-
-    logger.info("Writing to JSON…")
-    data = df_to_dict(
-        df,
-        macro_variables.keys(),
-        valid_json=True,
-    )
-    obj_to_s3(data, "s3://covid-19/public/owid-covid-data.json", public=True)
+    """Export dataset as CSV, XLSX, JSON, Parquet and Feather (complete time series)."""
+    logger.info("Writing to CSV, XLSX, JSON, Parquet and Feather…")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        artifacts = [
+            ExportArtifact(
+                name="owid-covid-data.csv",
+                path=os.path.join(DATA_DIR, "owid-covid-data.csv"),
+                render=_render_csv,
+                args=(df,),
+                s3_path="s3://covid-19/public/owid-covid-data.csv",
+                compress=("gzip", "br"),
+            ),
+            ExportArtifact(
+                name="owid-covid-data.xlsx",
+                path=os.path.join(tmp_dir, "owid-covid-data.xlsx"),
+                render=_render_xlsx,
+                args=(df,),
+                s3_path="s3://covid-19/public/owid-covid-data.xlsx",
+            ),
+            ExportArtifact(
+                name="owid-covid-data.json",
+                path=os.path.join(tmp_dir, "owid-covid-data.json"),
+                render=_render_json,
+                args=(df, list(macro_variables.keys())),
+                s3_path="s3://covid-19/public/owid-covid-data.json",
+                compress=("gzip", "br"),
+            ),
+            ExportArtifact(
+                name="owid-covid-data.parquet",
+                path=PATHS.DATA_MAIN_PARQUET_FILE,
+                render=_render_parquet,
+                args=(df, "location"),
+                s3_path="s3://covid-19/public/owid-covid-data.parquet",
+            ),
+            ExportArtifact(
+                name="owid-covid-data.feather",
+                path=PATHS.DATA_MAIN_FEATHER_FILE,
+                render=_render_feather,
+                args=(df,),
+                s3_path="s3://covid-19/public/owid-covid-data.feather",
+            ),
+        ]
+        run_export_stage(artifacts, logger)
 
 
 def create_latest(df, logger):
-    """Export dataset as CSV, XLSX and JSON (latest data points)."""
-    df = df[df.date >= str(date.today() - timedelta(weeks=2))]
+    """Export dataset as CSV, XLSX, JSON, Parquet and Feather (latest data points)."""
+    df = restore_dtypes(df[df.date >= latest_window_start()])
     df = df.sort_values("date")
 
     latest = [df[df.location == loc].ffill().tail(1).round(3) for loc in set(df.location)]
@@ -43,24 +79,91 @@ def create_latest(df, logger):
     latest = latest.sort_values("location").rename(columns={"date": "last_updated_date"})
 
     logger.info("Writing latest version…")
-    # CSV
-    latest.to_csv(os.path.join(DATA_DIR, "latest", "owid-covid-latest.csv"), index=False)
-    S3().upload_to_s3(
-        os.path.join(DATA_DIR, "latest", "owid-covid-latest.csv"),
-        "s3://covid-19/public/latest/owid-covid-latest.csv",
-        public=True,
-    )
-    # XLSX
-    obj_to_s3(latest, s3_path="s3://covid-19/public/latest/owid-covid-latest.xlsx", public=True)
-    # JSON
-    latest.dropna(subset=["iso_code"]).set_index("iso_code").to_json(
-        os.path.join(DATA_DIR, "latest", "owid-covid-latest.json"), orient="index"
-    )
-    S3().upload_to_s3(
-        os.path.join(DATA_DIR, "latest", "owid-covid-latest.json"),
-        "s3://covid-19/public/latest/owid-covid-latest.json",
-        public=True,
-    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        artifacts = [
+            ExportArtifact(
+                name="owid-covid-latest.csv",
+                path=os.path.join(DATA_DIR, "latest", "owid-covid-latest.csv"),
+                render=_render_csv,
+                args=(latest,),
+                s3_path="s3://covid-19/public/latest/owid-covid-latest.csv",
+                compress=("gzip", "br"),
+            ),
+            ExportArtifact(
+                name="owid-covid-latest.xlsx",
+                path=os.path.join(tmp_dir, "owid-covid-latest.xlsx"),
+                render=_render_xlsx,
+                args=(latest,),
+                s3_path="s3://covid-19/public/latest/owid-covid-latest.xlsx",
+            ),
+            ExportArtifact(
+                name="owid-covid-latest.json",
+                path=os.path.join(DATA_DIR, "latest", "owid-covid-latest.json"),
+                render=_render_json_latest,
+                args=(latest,),
+                s3_path="s3://covid-19/public/latest/owid-covid-latest.json",
+                compress=("gzip", "br"),
+            ),
+            ExportArtifact(
+                name="owid-covid-latest.parquet",
+                path=PATHS.DATA_LATEST_PARQUET_FILE,
+                render=_render_parquet,
+                args=(latest,),
+                s3_path="s3://covid-19/public/latest/owid-covid-latest.parquet",
+            ),
+            ExportArtifact(
+                name="owid-covid-latest.feather",
+                path=PATHS.DATA_LATEST_FEATHER_FILE,
+                render=_render_feather,
+                args=(latest,),
+                s3_path="s3://covid-19/public/latest/owid-covid-latest.feather",
+            ),
+        ]
+        run_export_stage(artifacts, logger)
+
+
+# Render functions, run by the export stage in separate processes. Original dtypes (see `cowidev.megafile.schema`) are
+# restored there, so that the main process keeps the compact frame
+def _render_csv(path, df):
+    restore_dtypes(df).to_csv(path, index=False)
+
+
+def _render_xlsx(path, df):
+    df = restore_dtypes(df)
+    with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+        writer.book.set_properties({"created": XLSX_CREATED})
+        df.to_excel(writer, index=False)
+
+
+def _render_json(path, df, static_columns):
+    df_to_json(restore_dtypes(df), path, static_columns)
+
+
+def _render_json_latest(path, latest):
+    latest = restore_dtypes(latest)
+    latest.dropna(subset=["iso_code"]).set_index("iso_code").to_json(path, orient="index")
+
+
+def _render_parquet(path, df, row_group_by=None):
+    """Write `df` as Parquet (with column statistics).
+
+    If `row_group_by` is given, each run of consecutive rows with the same value in that column is written as a
+    separate row group, so that readers can skip row groups using the column statistics (predicate pushdown).
+    """
+    df = restore_dtypes(df)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, table.schema, compression="snappy", write_statistics=True) as writer:
+        if row_group_by is None:
+            writer.write_table(table)
+            return
+        values = df[row_group_by].to_numpy()
+        bounds = np.concatenate([[0], np.flatnonzero(values[1:] != values[:-1]) + 1, [len(values)]])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            writer.write_table(table.slice(start, end - start))
+
+
+def _render_feather(path, df):
+    restore_dtypes(df).reset_index(drop=True).to_feather(path)
 
 
 def df_to_dict(complete_dataset, static_columns, valid_json=False):
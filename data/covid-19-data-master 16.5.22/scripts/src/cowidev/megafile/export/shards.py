@@ -0,0 +1,73 @@
+"""Per-location shards of the megafile.
+
+Each location is exported to its own CSV and Parquet file (named after its ISO code), so that consumers interested in
+a few countries don't need to download the complete dataset. A manifest (manifest.json) lists the shards, with their
+row counts, date ranges and content hashes. Shards of locations no longer in the dataset are removed.
+"""
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cowidev.megafile.schema import restore_dtypes, sort_by_location_date
+
+
+def _write(path: str, content: bytes) -> dict:
+    with open(path, "wb") as f:
+        f.write(content)
+    return {"file": os.path.basename(path), "size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+
+
+def _write_shard(df: pd.DataFrame, output_dir: str) -> dict:
+    """Write shard `df` (rows of a single location) as CSV and Parquet. Returns its manifest entry."""
+    # Original dtypes (see `cowidev.megafile.schema`), restored for this location only
+    df = restore_dtypes(df)
+    iso_code = df["iso_code"].iat[0]
+    # Files are rendered in memory, so that they are hashed without reading them back
+    csv = df.to_csv(index=False).encode()
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buffer, compression="snappy")
+    return {
+        "location": df["location"].iat[0],
+        "iso_code": iso_code,
+        "rows": len(df),
+        "first_date": df["date"].iat[0],
+        "last_date": df["date"].iat[-1],
+        "csv": _write(os.path.join(output_dir, f"{iso_code}.csv"), csv),
+        "parquet": _write(os.path.join(output_dir, f"{iso_code}.parquet"), buffer.getvalue()),
+    }
+
+
+def create_shards(df: pd.DataFrame, output_dir: str, logger, max_workers: int = None):
+    """Export one CSV and one Parquet file per location in `df`, plus a manifest.
+
+    Shards are positional slices (views) of the frame sorted by location and date, written concurrently.
+    """
+    logger.info("Writing per-location shards…")
+    df = sort_by_location_date(df)
+    os.makedirs(output_dir, exist_ok=True)
+    # Boundaries of each run of rows with the same location
+    locations = df["location"].to_numpy()
+    bounds = np.concatenate([[0], np.flatnonzero(locations[1:] != locations[:-1]) + 1, [len(locations)]])
+    slices = [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        shards = list(executor.map(lambda df_: _write_shard(df_, output_dir), slices))
+    # Remove shards of locations no longer in the dataset
+    written = {shard[kind]["file"] for shard in shards for kind in ("csv", "parquet")}
+    for filename in os.listdir(output_dir):
+        if filename.endswith((".csv", ".parquet")) and filename not in written:
+            os.remove(os.path.join(output_dir, filename))
+    manifest = {
+        "rows": len(df),
+        "columns": list(df.columns),
+        "shards": shards,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Written {len(shards)} shards to {output_dir}")
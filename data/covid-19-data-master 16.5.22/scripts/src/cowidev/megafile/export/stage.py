@@ -0,0 +1,173 @@
+"""Concurrent export of megafile artifacts.
+
+Artifacts are rendered in a process pool (rendering CSV/XLSX/JSON is CPU-bound), and each artifact is uploaded to S3
+from a thread pool as soon as it is rendered, so that uploads overlap with the rendering of the remaining artifacts.
+Artifacts whose content did not change since the last upload are not uploaded again (see `S3.upload_if_changed`).
+
+Artifacts can also be published pre-compressed (`compress`): once rendered, the file is streamed through each
+compressor in the process pool, and the compressed variant is uploaded next to it (with suffix .gz or .br).
+
+Dataframes passed as render arguments are written to a temporary file once, and each render process reads them from
+there, instead of receiving its own pickled copy with every task. The process pool is capped at the number of CPUs,
+so at most that many copies of a frame are in memory at the same time.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import brotli
+import pandas as pd
+
+from cowidev.utils.s3 import S3
+
+
+# File suffix of each supported content encoding
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "br": ".br",
+}
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ExportArtifact:
+    """Artifact to export.
+
+    `render(path, *args)` must be a module-level function (it is run in a separate process) that writes the artifact
+    to `path`. If `s3_path` is given, the rendered file is uploaded there. For each encoding in `compress` ("gzip",
+    "br"), a compressed variant of the rendered file is also uploaded.
+    """
+
+    name: str
+    path: str
+    render: Callable
+    args: tuple = ()
+    s3_path: Optional[str] = None
+    public: bool = True
+    compress: tuple = ()
+    timing: dict = field(default_factory=dict)
+
+
+def _compress(path, source, encoding):
+    """Stream file `source` through the `encoding` compressor into `path`."""
+    with open(source, "rb") as fr, open(path, "wb") as fw:
+        if encoding == "gzip":
+            # mtime=0, so that the same content always gives the same (hashable) output
+            with gzip.GzipFile(fileobj=fw, mode="wb", mtime=0) as fz:
+                shutil.copyfileobj(fr, fz, CHUNK_SIZE)
+        elif encoding == "br":
+            compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=9)
+            for chunk in iter(lambda: fr.read(CHUNK_SIZE), b""):
+                fw.write(compressor.process(chunk))
+            fw.write(compressor.finish())
+        else:
+            raise ValueError(f"Unsupported encoding {encoding}. Use one of {list(COMPRESSION_SUFFIXES)}")
+
+
+def _compressed_variant(artifact: ExportArtifact, encoding: str, output_dir: str) -> ExportArtifact:
+    suffix = COMPRESSION_SUFFIXES[encoding]
+    return ExportArtifact(
+        name=f"{artifact.name}{suffix}",
+        path=os.path.join(output_dir, f"{artifact.name}{suffix}"),
+        render=_compress,
+        args=(artifact.path, encoding),
+        s3_path=f"{artifact.s3_path}{suffix}" if artifact.s3_path is not None else None,
+        public=artifact.public,
+    )
+
+
+@dataclass(frozen=True)
+class _FrameFile:
+    """Dataframe render argument, written to `path` (see `_spill_frames`)."""
+
+    path: str
+
+
+def _spill_frames(artifacts: list, output_dir: str):
+    """Replace dataframe arguments of `artifacts` with references to a file, writing each distinct frame once."""
+    # Keyed by id, with the frame itself, so that ids are not reused while replacing
+    files = {}
+    for artifact in artifacts:
+        args = []
+        for arg in artifact.args:
+            if isinstance(arg, pd.DataFrame):
+                if id(arg) not in files:
+                    frame_file = _FrameFile(os.path.join(output_dir, f"frame-{len(files)}.pkl"))
+                    arg.to_pickle(frame_file.path)
+                    files[id(arg)] = (arg, frame_file)
+                arg = files[id(arg)][1]
+            args.append(arg)
+        artifact.args = tuple(args)
+
+
+def _render(artifact: ExportArtifact):
+    t0 = time.time()
+    args = [pd.read_pickle(arg.path) if isinstance(arg, _FrameFile) else arg for arg in artifact.args]
+    artifact.render(artifact.path, *args)
+    return time.time() - t0
+
+
+def _upload(artifact: ExportArtifact):
+    t0 = time.time()
+    uploaded = S3().upload_if_changed(artifact.path, artifact.s3_path, public=artifact.public)
+    return uploaded, time.time() - t0
+
+
+def run_export_stage(artifacts: list, logger, max_workers: int = None):
+    """Render all `artifacts` (and their compressed variants) concurrently and upload them as they become available.
+
+    Renders run in a pool of `max_workers` processes (by default, the number of CPUs). Logs a timing report (render and
+    upload time, size) per artifact.
+    """
+    n_tasks = len(artifacts) + sum(len(artifact.compress) for artifact in artifacts)
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, n_tasks)
+    t0 = time.time()
+    rendered = []
+    # Compressed variants and spilled frames are temporary, only their upload is kept
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _spill_frames(artifacts, tmp_dir)
+        # Uploads are I/O-bound, all of them can run at the same time
+        with ProcessPoolExecutor(max_workers) as render_pool, ThreadPoolExecutor(n_tasks) as upload_pool:
+            renders = {render_pool.submit(_render, artifact): artifact for artifact in artifacts}
+            uploads = {}
+            while renders:
+                done, _ = wait(renders, return_when=FIRST_COMPLETED)
+                for future in done:
+                    artifact = renders.pop(future)
+                    artifact.timing["render"] = future.result()
+                    rendered.append(artifact)
+                    logger.info(f"Rendered {artifact.name} ({artifact.timing['render']:.1f}s)")
+                    # Compress the rendered file (instead of rendering the data again)
+                    for encoding in artifact.compress:
+                        variant = _compressed_variant(artifact, encoding, tmp_dir)
+                        renders[render_pool.submit(_render, variant)] = variant
+                    if artifact.s3_path is not None:
+                        uploads[upload_pool.submit(_upload, artifact)] = artifact
+            for future in as_completed(uploads):
+                artifact = uploads[future]
+                uploaded, artifact.timing["upload"] = future.result()
+                if uploaded:
+                    logger.info(f"Uploaded {artifact.name} ({artifact.timing['upload']:.1f}s)")
+                else:
+                    artifact.timing["skipped"] = True
+                    logger.info(f"Skipped upload of {artifact.name}, unchanged ({artifact.timing['upload']:.1f}s)")
+        _log_report(rendered, logger, time.time() - t0)
+
+
+def _log_report(artifacts: list, logger, total: float):
+    lines = [f"Export report ({total:.1f}s total):"]
+    for artifact in artifacts:
+        size = os.path.getsize(artifact.path) / 1e6
+        upload = f"{artifact.timing['upload']:.1f}s" if "upload" in artifact.timing else "-"
+        if artifact.timing.get("skipped"):
+            upload = f"{upload} (unchanged)"
+        lines.append(
+            f"  {artifact.name:<40} render={artifact.timing['render']:.1f}s upload={upload} size={size:.1f}MB"
+        )
+    logger.info("\n".join(lines))
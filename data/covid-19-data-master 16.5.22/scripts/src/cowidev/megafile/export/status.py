@@ -1,32 +1,42 @@
 import pandas as pd
 from cowidev import PATHS
+from cowidev.utils.io import load_template
 
 
-def load_status_get(path, path_ts):
+def _status_table(path, columns, sort_by):
     df = pd.read_csv(path)
-
-    def _msg_err(x):
-        try:
-            err = x.replace("\n", "<br>")
-            return f"<details><summary>show</summary><pre>{err}</pre></details>"
-        except:
-            return ""
-
+    # Errors are shown in collapsible blocks (empty if there was no error)
+    errors = df.error.astype(object).where(df.error.map(lambda x: isinstance(x, str)))
     df = (
         df.assign(
             status=df.success.replace({True: "✅", False: "❌"}).fillna("⚠️"),
             status_id=df.success.replace({True: 1, False: 0}).fillna(0.5),
-            error=df.error.apply(lambda x: _msg_err(x)),
+            error=(
+                "<details><summary>show</summary><pre>" + errors.str.replace("\n", "<br>") + "</pre></details>"
+            ).fillna(""),
         )
-        .sort_values(["status_id", "timestamp", "execution_time (sec)"], ascending=[True, False, False])
-        .drop(columns=["success", "status_id"])[["module", "status", "timestamp", "execution_time (sec)", "error"]]
+        .sort_values(["status_id"] + sort_by, ascending=[True] + [False] * len(sort_by))
+        .drop(columns=["success", "status_id"])[columns]
     )
-    table = df.to_html(index=False, escape=False)
+    return df
+
+
+def _status_text(df, path_ts, noun):
     n_fail = (df.status == "❌").sum()
     n_skip = (df.status == "⚠️").sum()
     with open(path_ts, "r") as f:
         date_last = f.read()
-    text = f"`{n_fail}/{len(df)}` scripts failed, `{n_skip}/{len(df)}` were skipped. Latest update was `{date_last}`."
+    return f"`{n_fail}/{len(df)}` {noun} failed, `{n_skip}/{len(df)}` were skipped. Latest update was `{date_last}`."
+
+
+def load_status_get(path, path_ts):
+    df = _status_table(
+        path,
+        columns=["module", "status", "timestamp", "execution_time (sec)", "error"],
+        sort_by=["timestamp", "execution_time (sec)"],
+    )
+    table = df.to_html(index=False, escape=False)
+    text = _status_text(df, path_ts, "scripts")
     return f"""{text}
 
 {table}
@@ -34,30 +44,9 @@ def load_status_get(path, path_ts):
 
 
 def load_status_process(path, path_ts):
-    df = pd.read_csv(path)
-
-    def _msg_err(x):
-        try:
-            err = x.replace("\n", "<br>")
-            return f"<details><summary>show</summary><pre>{err}</pre></details>"
-        except:
-            return ""
-
-    df = (
-        df.assign(
-            status=df.success.replace({True: "✅", False: "❌"}).fillna("⚠️"),
-            status_id=df.success.replace({True: 1, False: 0}).fillna(0.5),
-            error=df.error.apply(lambda x: _msg_err(x)),
-        )
-        .sort_values(["status_id", "timestamp"], ascending=[True, False])
-        .drop(columns=["success", "status_id"])[["location", "status", "timestamp", "error"]]
-    )
+    df = _status_table(path, columns=["location", "status", "timestamp", "error"], sort_by=["timestamp"])
     table = df.to_html(index=False, escape=False)
-    n_fail = (df.status == "❌").sum()
-    n_skip = (df.status == "⚠️").sum()
-    with open(path_ts, "r") as f:
-        date_last = f.read()
-    text = f"`{n_fail}/{len(df)}` processes failed, `{n_skip}/{len(df)}` were skipped. Latest update was `{date_last}`."
+    text = _status_text(df, path_ts, "processes")
     return f"""{text}
 
 {table}
@@ -80,8 +69,6 @@ def get_placeholder():
 
 def generate_status(template: str, output: str):
     placeholders = get_placeholder()
-    with open(template, "r", encoding="utf-8") as fr:
-        s = fr.read()
-        s = s.format(**placeholders)
-        with open(output, "w", encoding="utf-8") as fw:
-            fw.write(s)
+    s = load_template(template).format(**placeholders)
+    with open(output, "w", encoding="utf-8") as fw:
+        fw.write(s)
@@ -1,13 +1,18 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 
-import pandas as pd
-
+from cowidev.utils.inputs import read_input
 from cowidev.utils.utils import export_timestamp
 from cowidev import PATHS
+from cowidev.megafile.cache import StepCache
+from cowidev.megafile.schema import align_categorical, compact_dtypes
+from cowidev.megafile.validation import validate_megafile
+from cowidev.utils.profiling import StepProfiler
 from cowidev.megafile.steps import (
     get_base_dataset,
     add_macro_variables,
+    get_macro_table,
     add_excess_mortality,
     add_rolling_vaccinations,
 )
@@ -15,6 +20,8 @@ from cowidev.megafile.export import (
     create_internal,
     create_dataset,
     create_latest,
+    create_shards,
+    latest_window_start,
     generate_readme,
     generate_status,
     generate_htmls,
@@ -29,12 +36,32 @@ README_TMP = PATHS.INTERNAL_INPUT_OWID_READ_FILE
 README_FILE = PATHS.DATA_READ_FILE
 
 
-def generate_megafile(logger):
-    """Generate megafile data."""
-    all_covid = get_base_dataset(logger)
+def generate_megafile(logger, incremental: bool = False, shards: bool = False):
+    """Generate megafile data.
+
+    With `incremental=True`, step outputs are cached and only recomputed if their inputs changed. If no input changed
+    since the previous run, nothing is regenerated. Otherwise, only internal files whose content changed are exported.
+
+    With `shards=True`, the dataset is also exported as one file per location (see `create_shards`).
+
+    Each step is profiled (wall time, CPU time, memory and output shape), and a run report is exported next to the
+    timestamp files.
+    """
+    cache = StepCache(enabled=incremental)
+    profiler = StepProfiler(logger)
+    all_covid = get_base_dataset(logger, cache, profiler)
 
     # Remove today's datapoint
     all_covid = all_covid[all_covid["date"] < str(date.today())]
+    # With unchanged inputs, outputs only change with the day if the filter above includes new rows (i.e. the last date
+    # changes), or if the window of the latest data points excludes some rows (i.e. its first date changes)
+    cache.check_signature(
+        "dates",
+        {
+            "last": str(all_covid["date"].max()),
+            "latest_first": str(all_covid.loc[all_covid["date"] >= latest_window_start(), "date"].min()),
+        },
+    )
 
     # Exclude some entities from megafile
     excluded = ["Summer Olympics 2020", "Winter Olympics 2022"]
@@ -42,25 +69,31 @@ def generate_megafile(logger):
 
     # Add ISO codes
     logger.info("Adding ISO codes…")
-    iso_codes = pd.read_csv(PATHS.INTERNAL_INPUT_ISO_FILE)
+    iso_codes = read_input(PATHS.INTERNAL_INPUT_ISO_FILE)
 
     missing_iso = set(all_covid.location).difference(set(iso_codes.location))
     if len(missing_iso) > 0:
         # print(missing_iso)
         raise Exception(f"Missing ISO code for some locations: {missing_iso}")
 
-    all_covid = iso_codes.merge(all_covid, on="location")
+    with profiler.step("merge_iso_codes") as step:
+        # Merged on the categorical location
+        all_covid = align_categorical(iso_codes, all_covid, "location").merge(all_covid, on="location")
+        step.set_frame(all_covid)
 
     # Add continents
     logger.info("Adding continents…")
-    continents = pd.read_csv(
+    continents = read_input(
         PATHS.INTERNAL_INPUT_OWID_CONT_FILE,
         names=["_1", "iso_code", "_2", "continent"],
         usecols=["iso_code", "continent"],
         header=0,
     )
 
-    all_covid = continents.merge(all_covid, on="iso_code", how="right")
+    with profiler.step("merge_continents") as step:
+        all_covid = continents.merge(all_covid, on="iso_code", how="right")
+        step.set_frame(all_covid)
+    all_covid = compact_dtypes(all_covid)
 
     # Add macro variables
     # - the key is the name of the variable of interest
@@ -82,31 +115,53 @@ def generate_megafile(logger):
         "life_expectancy": "owid/life_expectancy.csv",
         "human_development_index": "un/human_development_index.csv",
     }
-    all_covid = add_macro_variables(all_covid, macro_variables, INPUT_DIR)
+    xm_files = {
+        "wmd_hmd_file": os.path.join(DATA_DIR, "excess_mortality", "excess_mortality.csv"),
+        "economist_file": os.path.join(DATA_DIR, "excess_mortality", "excess_mortality_economist_estimates.csv"),
+    }
+    cache.check(
+        "static",
+        inputs=[
+            PATHS.INTERNAL_INPUT_ISO_FILE,
+            PATHS.INTERNAL_INPUT_OWID_CONT_FILE,
+            ANNOTATIONS_PATH,
+            *[os.path.join(INPUT_DIR, file) for file in macro_variables.values()],
+            *xm_files.values(),
+        ],
+    )
+    if cache.up_to_date:
+        logger.info("No changes in megafile inputs since last run, skipping.")
+        profiler.export(PATHS.DATA_TIMESTAMP_REPORT_FILE)
+        return
+
+    all_covid = profiler.profile()(add_macro_variables)(all_covid, macro_variables, INPUT_DIR)
 
     # Add excess mortality
-    all_covid = add_excess_mortality(
-        df=all_covid,
-        wmd_hmd_file=os.path.join(DATA_DIR, "excess_mortality", "excess_mortality.csv"),
-        economist_file=os.path.join(DATA_DIR, "excess_mortality", "excess_mortality_economist_estimates.csv"),
-    )
+    all_covid = profiler.profile()(add_excess_mortality)(df=all_covid, **xm_files)
 
     # Calculate rolling vaccinations
-    all_covid = add_rolling_vaccinations(all_covid)
+    all_covid = profiler.profile()(add_rolling_vaccinations)(all_covid)
+    # Macro and excess mortality columns
+    all_covid = compact_dtypes(all_covid)
 
     # Sort by location and date
     all_covid = all_covid.sort_values(["location", "date"])
 
-    # Check that we only have 1 unique row for each location/date pair
-    assert all_covid.drop_duplicates(subset=["location", "date"]).shape == all_covid.shape
+    # Validate data (e.g. only 1 unique row for each location/date pair) before the exports
+    logger.info("Validating data…")
+    report = profiler.profile()(validate_megafile)(all_covid)
+    report.log(logger)
+    report.export(PATHS.DATA_TIMESTAMP_VALIDATION_FILE)
+    report.raise_for_errors()
 
     logger.info("Creating internal files…")
-    create_internal(
+    profiler.profile()(create_internal)(
         df=all_covid,
         output_dir=os.path.join(DATA_DIR, "internal"),
         annotations_path=ANNOTATIONS_PATH,
         country_data=DATA_VAX_COUNTRIES_DIR,
         logger=logger,
+        cache=cache,
     )
 
     # Drop columns not included in final dataset
@@ -140,30 +195,48 @@ def generate_megafile(logger):
 
     # Create light versions of complete dataset with only the latest data point
     logger.info("Writing latest…")
-    create_latest(all_covid, logger)
+    profiler.profile()(create_latest)(all_covid, logger)
 
     # Create datasets
-    create_dataset(all_covid, macro_variables, logger)
+    profiler.profile()(create_dataset)(all_covid, macro_variables, logger)
+
+    # Create per-location shards
+    if shards:
+        profiler.profile()(create_shards)(all_covid, PATHS.DATA_SHARDS_DIR, logger)
 
     # Store the last updated time
     # export_timestamp(PATHS.DATA_TIMESTAMP_OLD_FILE, force_directory=PATHS.DATA_DIR)  # @deprecate
 
-    # Update readme
-    logger.info("Generating public/data/README.md")
-    generate_readme(readme_template=README_TMP, readme_output=README_FILE)
-
-    # Update readme
-    logger.info("Generating scripts/STATUS.md")
-    generate_status(template=PATHS.INTERNAL_INPUT_TEMPLATE_STATUS, output=PATHS.INTERNAL_STATUS_FILE)
-
-    # Generate HTML aux tables
-    logger.info("Generating aux tables…")
-    generate_htmls()
+    # Small artifacts (README, STATUS and HTML tables) are rendered from in-memory data, concurrently with each other.
+    # They run after the exports, so that the CPU and RSS figures of the exports are not mixed with theirs
+    vax_locations = read_input(PATHS.DATA_VAX_META_FILE)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        logger.info("Generating public/data/README.md, scripts/STATUS.md and aux tables…")
+        small_artifacts = [
+            executor.submit(
+                profiler.profile()(generate_readme),
+                readme_template=README_TMP,
+                readme_output=README_FILE,
+                df=all_covid,
+                macro_table=get_macro_table(macro_variables, INPUT_DIR),
+            ),
+            executor.submit(
+                profiler.profile()(generate_status),
+                template=PATHS.INTERNAL_INPUT_TEMPLATE_STATUS,
+                output=PATHS.INTERNAL_STATUS_FILE,
+            ),
+            executor.submit(profiler.profile()(generate_htmls), df_locations=vax_locations),
+        ]
+    # Raise any error from the small artifacts
+    for future in small_artifacts:
+        future.result()
 
     # Export timestamp
     timestamp = generate_timestamp()
     print(timestamp)
     export_timestamp(PATHS.DATA_TIMESTAMP_ROOT_FILE, timestamp=timestamp)
+    cache.save()
+    profiler.export(PATHS.DATA_TIMESTAMP_REPORT_FILE)
 
     logger.info("All done!")
 
@@ -0,0 +1,41 @@
+import os
+
+import pandas as pd
+
+from cowidev import PATHS
+
+
+def read_megafile(columns: list = None, locations: list = None, latest: bool = False) -> pd.DataFrame:
+    """Read the megafile (owid-covid-data) from the public data directory.
+
+    Prefers the Parquet file (only the requested columns and location row groups are read), then the Feather file,
+    and falls back to the CSV if none of them is available.
+
+    Args:
+        columns (list, optional): Columns to load. Defaults to all.
+        locations (list, optional): Locations to load. Defaults to all.
+        latest (bool, optional): Set to True to read the latest version (owid-covid-latest). Defaults to False.
+    """
+    if latest:
+        paths = (PATHS.DATA_LATEST_PARQUET_FILE, PATHS.DATA_LATEST_FEATHER_FILE, PATHS.DATA_LATEST_FILE)
+    else:
+        paths = (PATHS.DATA_MAIN_PARQUET_FILE, PATHS.DATA_MAIN_FEATHER_FILE, PATHS.DATA_MAIN_FILE)
+    parquet_file, feather_file, csv_file = paths
+
+    # Location is needed to filter rows
+    columns_read = columns
+    if columns is not None and locations is not None and "location" not in columns:
+        columns_read = list(columns) + ["location"]
+
+    if os.path.isfile(parquet_file):
+        filters = [("location", "in", list(locations))] if locations is not None else None
+        return pd.read_parquet(parquet_file, columns=columns, filters=filters)
+    if os.path.isfile(feather_file):
+        df = pd.read_feather(feather_file, columns=columns_read)
+    else:
+        df = pd.read_csv(csv_file, usecols=columns_read)
+    if locations is not None:
+        df = df[df.location.isin(locations)].reset_index(drop=True)
+    if columns is not None:
+        df = df[columns]
+    return df
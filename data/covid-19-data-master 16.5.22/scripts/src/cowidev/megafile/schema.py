@@ -0,0 +1,213 @@
+"""Compact dtypes for the megafile frame.
+
+Repeated strings are stored as categoricals, and numeric columns as 4-byte float32 or as fixed-point nullable Int32
+(counts as integers, metrics with 3 decimals as thousandths), from the merge of the step outputs (which share a
+categorical `location`, see `categorical_keys`) through validation, derived metrics and exports. Original dtypes are
+only restored where the output needs them: `restore_dtypes` on the (small) frames written to JSON/CSV, and in each
+render process of the public exports, and `restore_column` for compact operands of arithmetic and comparisons.
+
+Notes:
+    - A compact dtype is only used for a column if restoring it gives back exactly the original values, otherwise the
+      column is kept as float64 (e.g. World totals above 2**31, or per-million metrics that exceed float32 precision).
+    - `restore_column` finds the scale of fixed-point columns by name, so restore them before renaming.
+    - `date` is kept as an ISO string, as it is compared with strings throughout the pipeline.
+"""
+import numpy as np
+import pandas as pd
+
+
+CATEGORICAL_COLUMNS = ["location", "iso_code", "continent", "tests_units"]
+
+# Integer counts, stored as fixed-point with 0 decimals
+COUNT_COLUMNS = [
+    # JHU
+    "total_cases",
+    "new_cases",
+    "total_deaths",
+    "new_deaths",
+    # Hospitalizations
+    "icu_patients",
+    "hosp_patients",
+    "weekly_icu_admissions",
+    "weekly_hosp_admissions",
+    # Testing
+    "total_tests",
+    "new_tests",
+    "new_tests_smoothed",
+    # Vaccinations
+    "total_vaccinations",
+    "people_vaccinated",
+    "people_fully_vaccinated",
+    "total_boosters",
+    "new_vaccinations",
+    "new_vaccinations_smoothed",
+    "new_vaccinations_smoothed_per_million",
+    "new_people_vaccinated_smoothed",
+    # Macro
+    "population",
+    # Excess mortality
+    "excess_mortality_cumulative_absolute",
+]
+# Metrics with at most 3 decimals, stored as fixed-point with 3 decimals
+METRIC_COLUMNS = [
+    # JHU
+    "new_cases_smoothed",
+    "new_deaths_smoothed",
+    "total_cases_per_million",
+    "new_cases_per_million",
+    "new_cases_smoothed_per_million",
+    "total_deaths_per_million",
+    "new_deaths_per_million",
+    "new_deaths_smoothed_per_million",
+    # Reproduction rate
+    "reproduction_rate",
+    # Hospitalizations
+    "icu_patients_per_million",
+    "hosp_patients_per_million",
+    "weekly_icu_admissions_per_million",
+    "weekly_hosp_admissions_per_million",
+    # Testing
+    "total_tests_per_thousand",
+    "new_tests_per_thousand",
+    "new_tests_smoothed_per_thousand",
+    "positive_rate",
+    "tests_per_case",
+    # Vaccinations
+    "total_vaccinations_per_hundred",
+    "people_vaccinated_per_hundred",
+    "people_fully_vaccinated_per_hundred",
+    "total_boosters_per_hundred",
+    "new_people_vaccinated_smoothed_per_hundred",
+    # Policy
+    "stringency_index",
+    # Macro
+    "population_density",
+    "median_age",
+    "aged_65_older",
+    "aged_70_older",
+    "gdp_per_capita",
+    "extreme_poverty",
+    "cardiovasc_death_rate",
+    "diabetes_prevalence",
+    "female_smokers",
+    "male_smokers",
+    "handwashing_facilities",
+    "hospital_beds_per_thousand",
+    "life_expectancy",
+    "human_development_index",
+    # Excess mortality
+    "excess_mortality",
+    "excess_mortality_cumulative",
+    "excess_mortality_cumulative_per_million",
+]
+DECIMALS = {**{column: 0 for column in COUNT_COLUMNS}, **{column: 3 for column in METRIC_COLUMNS}}
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def _restore_float(values: pd.Series, decimals: int) -> pd.Series:
+    return values.astype(np.float64).round(decimals)
+
+
+def _restore_fixed_point(values: pd.Series, decimals: int) -> pd.Series:
+    restored = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    if decimals:
+        # Correctly rounded division, i.e. the float64 nearest to the decimal value
+        restored = restored / 10**decimals
+    return pd.Series(restored, index=values.index, name=values.name)
+
+
+def _compact_float(values: pd.Series, decimals: int):
+    """Return `values` as float32 or fixed-point Int32 if either restores exactly, otherwise None."""
+    float32 = values.astype(np.float32)
+    if _restore_float(float32, decimals).equals(values):
+        return float32
+    scaled = values.to_numpy() * 10**decimals
+    # Negative zeros would be written as "0.0"
+    if np.nanmax(np.abs(scaled), initial=0) >= INT32_MAX or np.signbit(scaled[scaled == 0]).any():
+        return None
+    fixed_point = pd.Series(np.round(scaled), index=values.index, name=values.name).astype("Int32")
+    if _restore_fixed_point(fixed_point, decimals).equals(values):
+        return fixed_point
+    return None
+
+
+def compact_dtypes(df: pd.DataFrame, categorical: bool = True) -> pd.DataFrame:
+    """Downcast the columns of `df` declared in the schema.
+
+    Set `categorical=False` for frames that are still to be merged on their keys (merging on categoricals with
+    different categories falls back to object, see `categorical_keys`).
+    """
+    df = df.copy(deep=False)
+    for column, decimals in DECIMALS.items():
+        if column in df.columns and df[column].dtype == np.float64:
+            values = _compact_float(df[column], decimals)
+            if values is not None:
+                df[column] = values
+    if categorical:
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns and df[column].dtype == object:
+                df[column] = df[column].astype("category")
+    elif "tests_units" in df.columns:
+        df["tests_units"] = df["tests_units"].astype("category")
+    return df
+
+
+def categorical_keys(frames: list, column: str = "location") -> list:
+    """Cast `column` of all `frames` to the same categorical dtype, so that merging them on it keeps the categorical.
+
+    Categories are sorted, so that sorting by `column` gives the same order as with strings.
+    """
+    categories = sorted(set().union(*(df[column].dropna().unique() for df in frames)))
+    dtype = pd.CategoricalDtype(categories)
+    return [df.assign(**{column: df[column].astype(dtype)}) for df in frames]
+
+
+def _is_compact(dtype) -> bool:
+    return dtype == np.float32 or isinstance(dtype, (pd.Int32Dtype, pd.CategoricalDtype))
+
+
+def restore_column(values: pd.Series) -> pd.Series:
+    """Revert the dtype set by `compact_dtypes` for a single column (named as in the schema)."""
+    if values.dtype == np.float32:
+        return _restore_float(values, DECIMALS.get(values.name, 3))
+    if isinstance(values.dtype, pd.Int32Dtype):
+        return _restore_fixed_point(values, DECIMALS.get(values.name, 0))
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(object)
+    return values
+
+
+def restore_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Revert the dtypes set by `compact_dtypes`."""
+    df = df.copy(deep=False)
+    for column in df.columns:
+        if _is_compact(df[column].dtype):
+            df[column] = restore_column(df[column])
+    return df
+
+
+def align_categorical(df: pd.DataFrame, other: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Cast `df[column]` to the categorical dtype of `other[column]`, so that both can be merged on it.
+
+    Rows with values not present in `other` are dropped, as they could not be matched anyway.
+    """
+    dtype = other[column].dtype
+    if not isinstance(dtype, pd.CategoricalDtype):
+        return df
+    df = df[df[column].isin(dtype.categories)].copy()
+    df[column] = df[column].astype(dtype)
+    return df
+
+
+def sort_by_location_date(df: pd.DataFrame) -> pd.DataFrame:
+    """Sort `df` by location and date, unless it is already sorted (checked on both keys, with a categorical location
+    compared by value).
+    """
+    location = df.location.to_numpy()
+    date = df.date.astype(str).to_numpy()
+    is_sorted = (
+        (location[1:] > location[:-1]) | ((location[1:] == location[:-1]) & (date[1:] >= date[:-1]))
+    ).all()
+    if is_sorted:
+        return df
+    return df.sort_values(["location", "date"])
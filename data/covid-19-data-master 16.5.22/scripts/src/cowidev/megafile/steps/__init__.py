@@ -1,11 +1,12 @@
 from cowidev.megafile.steps.core import get_base_dataset
-from cowidev.megafile.steps.macro import add_macro_variables
+from cowidev.megafile.steps.macro import add_macro_variables, get_macro_table
 from cowidev.megafile.steps.xm import add_excess_mortality
 from cowidev.megafile.steps.vax import add_rolling_vaccinations
 
 __all__ = [
     "get_base_dataset",
     "add_macro_variables",
+    "get_macro_table",
     "add_excess_mortality",
     "add_rolling_vaccinations",
 ]
@@ -1,9 +1,12 @@
 import os
 
 from cowidev import PATHS
+from cowidev.megafile.cache import StepCache
+from cowidev.megafile.schema import categorical_keys, compact_dtypes
+from cowidev.utils.profiling import StepProfiler
 from cowidev.megafile.steps.cgrt import get_cgrt
 from cowidev.megafile.steps.hosp import get_hosp
-from cowidev.megafile.steps.jhu import get_jhu
+from cowidev.megafile.steps.jhu import get_jhu, JHU_VARIABLES
 from cowidev.megafile.steps.reprod import get_reprod
 from cowidev.megafile.steps.test import get_testing
 from cowidev.megafile.steps.variants import get_variants
@@ -13,49 +16,105 @@ from cowidev.megafile.steps.vax import get_vax
 INPUT_DIR = PATHS.INTERNAL_INPUT_DIR
 GRAPHER_DIR = PATHS.INTERNAL_GRAPHER_DIR
 DATA_DIR = PATHS.DATA_DIR
+JHU_FILES = [f"{var}.csv" for var in JHU_VARIABLES]
 
 
-def get_base_dataset(logger):
-    """Get owid datasets from: jhu, reproduction rate, hospitalizations, testing ,vaccinations, CGRT."""
+def get_base_dataset(logger, cache: StepCache = None, profiler: StepProfiler = None):
+    """Get owid datasets from: jhu, reproduction rate, hospitalizations, testing ,vaccinations, CGRT.
+
+    If a `cache` is given, steps whose input files did not change since the previous run are read from it. If a
+    `profiler` is given, each step is profiled with it.
+    """
+    if cache is None:
+        cache = StepCache(enabled=False)
+    if profiler is None:
+        profiler = StepProfiler()
+
     logger.info("Fetching JHU dataset…")
-    jhu = get_jhu(jhu_dir=PATHS.DATA_JHU_DIR)
+    with profiler.step("get_jhu") as step:
+        jhu = cache.load(
+            "jhu",
+            inputs=[PATHS.DATA_TIMESTAMP_JHU_FILE] + [os.path.join(PATHS.DATA_JHU_DIR, f) for f in JHU_FILES],
+            func=get_jhu,
+            jhu_dir=PATHS.DATA_JHU_DIR,
+        )
+        step.set_frame(jhu)
 
     logger.info("Fetching reproduction rate…")
-    reprod = get_reprod(
-        file_url="https://github.com/crondonm/TrackingR/raw/main/Estimates-Database/database_7.csv",
-        country_mapping=os.path.join(INPUT_DIR, "reproduction", "reprod_country_standardized.csv"),
-    )
+    reprod_url = "https://github.com/crondonm/TrackingR/raw/main/Estimates-Database/database_7.csv"
+    reprod_mapping = os.path.join(INPUT_DIR, "reproduction", "reprod_country_standardized.csv")
+    with profiler.step("get_reprod") as step:
+        reprod = cache.load(
+            "reprod",
+            inputs=[reprod_url, reprod_mapping],
+            func=get_reprod,
+            file_url=reprod_url,
+            country_mapping=reprod_mapping,
+        )
+        step.set_frame(reprod)
 
     logger.info("Fetching hospital dataset…")
-    hosp = get_hosp(data_file=os.path.join(GRAPHER_DIR, "COVID-2019 - Hospital & ICU.csv"))
+    hosp_file = os.path.join(GRAPHER_DIR, "COVID-2019 - Hospital & ICU.csv")
+    with profiler.step("get_hosp") as step:
+        hosp = cache.load("hosp", inputs=[hosp_file], func=get_hosp, data_file=hosp_file)
+        step.set_frame(hosp)
 
     logger.info("Fetching testing dataset…")
-    testing = get_testing()
+    with profiler.step("get_testing") as step:
+        testing = cache.load(
+            "testing",
+            inputs=[PATHS.DATA_TIMESTAMP_TEST_FILE, PATHS.DATA_TEST_MAIN_FILE],
+            func=get_testing,
+            date_dependent=True,
+        )
+        step.set_frame(testing)
 
     logger.info("Fetching vaccination dataset…")
-    vax = get_vax(data_file=os.path.join(DATA_DIR, "vaccinations", "vaccinations.csv"))
+    vax_file = os.path.join(DATA_DIR, "vaccinations", "vaccinations.csv")
+    with profiler.step("get_vax") as step:
+        vax = cache.load("vax", inputs=[PATHS.DATA_TIMESTAMP_VAX_FILE, vax_file], func=get_vax, data_file=vax_file)
+        step.set_frame(vax)
     vax = vax[-vax.location.isin(["England", "Northern Ireland", "Scotland", "Wales"])]
 
     logger.info("Fetching OxCGRT dataset…")
-    cgrt = get_cgrt(
-        bsg_latest=os.path.join(INPUT_DIR, "bsg", "latest.csv"),
-        bsg_diff_latest=os.path.join(INPUT_DIR, "bsg", "latest-differentiated.csv"),
-        country_mapping=os.path.join(INPUT_DIR, "bsg", "bsg_country_standardised.csv"),
-    )
+    bsg_files = {
+        "bsg_latest": os.path.join(INPUT_DIR, "bsg", "latest.csv"),
+        "bsg_diff_latest": os.path.join(INPUT_DIR, "bsg", "latest-differentiated.csv"),
+        "country_mapping": os.path.join(INPUT_DIR, "bsg", "bsg_country_standardised.csv"),
+    }
+    with profiler.step("get_cgrt") as step:
+        cgrt = cache.load("cgrt", inputs=list(bsg_files.values()), func=get_cgrt, **bsg_files)
+        step.set_frame(cgrt)
 
     logger.info("Fetching variants dataset…")
-    variants = get_variants(
-        variants_file="s3://covid-19/internal/variants/covid-variants.csv",
-        cases_file=os.path.join(DATA_DIR, "jhu", "full_data.csv"),
+    variants_file = "s3://covid-19/internal/variants/covid-variants.csv"
+    cases_file = os.path.join(DATA_DIR, "jhu", "full_data.csv")
+    with profiler.step("get_variants") as step:
+        variants = cache.load(
+            "variants",
+            inputs=[variants_file, cases_file],
+            func=get_variants,
+            date_dependent=True,
+            variants_file=variants_file,
+            cases_file=cases_file,
+        )
+        step.set_frame(variants)
+
+    # Compact dtypes before merging, with the same categorical location in all frames
+    jhu, reprod, hosp, testing, vax, cgrt, variants = categorical_keys(
+        [compact_dtypes(df, categorical=False) for df in (jhu, reprod, hosp, testing, vax, cgrt, variants)]
     )
 
     # Big merge
-    return (
-        jhu.merge(reprod, on=["date", "location"], how="outer")
-        .merge(hosp, on=["date", "location"], how="outer")
-        .merge(testing, on=["date", "location"], how="outer")
-        .merge(vax, on=["date", "location"], how="outer")
-        .merge(cgrt, on=["date", "location"], how="left")
-        .merge(variants, on=["date", "location"], how="left")
-        .sort_values(["location", "date"])
-    )
+    with profiler.step("merge") as step:
+        df = (
+            jhu.merge(reprod, on=["date", "location"], how="outer")
+            .merge(hosp, on=["date", "location"], how="outer")
+            .merge(testing, on=["date", "location"], how="outer")
+            .merge(vax, on=["date", "location"], how="outer")
+            .merge(cgrt, on=["date", "location"], how="left")
+            .merge(variants, on=["date", "location"], how="left")
+            .sort_values(["location", "date"])
+        )
+        step.set_frame(df)
+    return df
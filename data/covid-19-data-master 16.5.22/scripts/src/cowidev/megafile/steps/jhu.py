@@ -4,6 +4,22 @@ from functools import reduce
 import pandas as pd
 
 
+JHU_VARIABLES = [
+    "total_cases",
+    "new_cases",
+    "weekly_cases",
+    "total_deaths",
+    "new_deaths",
+    "weekly_deaths",
+    "total_cases_per_million",
+    "new_cases_per_million",
+    "weekly_cases_per_million",
+    "total_deaths_per_million",
+    "new_deaths_per_million",
+    "weekly_deaths_per_million",
+]
+
+
 def get_jhu(jhu_dir: str):
     """
     Reads each COVID-19 JHU dataset located in /public/data/jhu/
@@ -14,25 +30,10 @@ def get_jhu(jhu_dir: str):
         jhu {dataframe}
     """
 
-    jhu_variables = [
-        "total_cases",
-        "new_cases",
-        "weekly_cases",
-        "total_deaths",
-        "new_deaths",
-        "weekly_deaths",
-        "total_cases_per_million",
-        "new_cases_per_million",
-        "weekly_cases_per_million",
-        "total_deaths_per_million",
-        "new_deaths_per_million",
-        "weekly_deaths_per_million",
-    ]
-
     data_frames = []
 
     # Process each file and melt it to vertical format
-    for jhu_var in jhu_variables:
+    for jhu_var in JHU_VARIABLES:
         tmp = pd.read_csv(os.path.join(jhu_dir, f"{jhu_var}.csv"))
         country_cols = list(tmp.columns)
         country_cols.remove("date")
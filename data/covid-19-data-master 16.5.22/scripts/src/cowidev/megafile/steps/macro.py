@@ -1,6 +1,20 @@
 import os
 import pandas as pd
 
+from cowidev.utils.inputs import read_input
+
+
+def _load_macro_variable(path: str, var: str) -> pd.Series:
+    """Load macro variable `var` from `path` as a series indexed by iso_code (parsed once, see `read_input`)."""
+    var_df = read_input(path, usecols=["iso_code", var])
+    var_df = var_df[-var_df["iso_code"].isnull()]
+    return var_df.set_index("iso_code")[var].round(3)
+
+
+def get_macro_table(macro_variables: dict, data_dir: str) -> dict:
+    """Build the country-attribute table with all macro variables, as {variable: series indexed by iso_code}."""
+    return {var: _load_macro_variable(os.path.join(data_dir, file), var) for var, file in macro_variables.items()}
+
 
 def add_macro_variables(complete_dataset: pd.DataFrame, macro_variables: dict, data_dir: str):
     """
@@ -8,14 +22,19 @@ def add_macro_variables(complete_dataset: pd.DataFrame, macro_variables: dict, d
     The data is denormalized, i.e. each yearly value (for example GDP per capita)
     is added to each row of the complete dataset. This is meant to facilitate the use
     of our dataset by non-experts.
+
+    iso_code is factorized once and each variable is attached by position, so that only the macro columns are
+    materialized (instead of copying the complete dataset once per variable).
     """
     original_shape = complete_dataset.shape
 
-    for var, file in macro_variables.items():
-        var_df = pd.read_csv(os.path.join(data_dir, file), usecols=["iso_code", var])
-        var_df = var_df[-var_df["iso_code"].isnull()]
-        var_df[var] = var_df[var].round(3)
-        complete_dataset = complete_dataset.merge(var_df, on="iso_code", how="left")
+    macro_table = get_macro_table(macro_variables, data_dir)
+    codes, iso_codes = pd.factorize(complete_dataset["iso_code"])
+    complete_dataset = complete_dataset.copy(deep=False)
+    for var, values in macro_table.items():
+        # Same semantics as a left merge: unmatched (or missing) iso_codes get NaN
+        values = values.reindex(iso_codes).to_numpy()
+        complete_dataset[var] = pd.api.extensions.take(values, codes, allow_fill=True)
 
     assert complete_dataset.shape[0] == original_shape[0]
     assert complete_dataset.shape[1] == original_shape[1] + len(macro_variables)
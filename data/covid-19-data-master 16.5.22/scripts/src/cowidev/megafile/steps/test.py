@@ -1,8 +1,8 @@
 import os
 from datetime import date
 
-import pandas as pd
 from cowidev import PATHS
+from cowidev.utils.inputs import read_input
 
 
 INPUT_DIR = PATHS.INTERNAL_INPUT_DIR
@@ -20,7 +20,7 @@ def get_testing():
         testing {dataframe}
     """
 
-    testing = pd.read_csv(
+    testing = read_input(
         data_file,
         usecols=[
             "Entity",
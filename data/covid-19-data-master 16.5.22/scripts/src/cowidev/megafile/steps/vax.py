@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 
+from cowidev.megafile.schema import restore_column
+
 
 def get_vax(data_file):
     vax = pd.read_csv(
@@ -42,19 +44,41 @@ def get_vax(data_file):
     return vax
 
 
-def _add_rolling(df: pd.DataFrame) -> pd.DataFrame:
-    last_known_date = df.loc[df.total_vaccinations.notnull(), "date"].max()
-    for n_months in (6, 9, 12):
-        n_days = round(365.2425 * n_months / 12)
-        df[f"rolling_vaccinations_{n_months}m"] = (
-            df.total_vaccinations.interpolate(method="linear").diff().rolling(n_days, min_periods=1).sum().round()
-        )
-        df.loc[df.date > last_known_date, f"rolling_vaccinations_{n_months}m"] = np.NaN
-        df[f"rolling_vaccinations_{n_months}m_per_hundred"] = (
-            df[f"rolling_vaccinations_{n_months}m"] * 100 / df.population
-        ).round(2)
-    return df
+def _interpolate_by_group(s: pd.Series, groups: pd.Series) -> pd.Series:
+    """Linear interpolation within each group, without a Python callback per group.
+
+    Equivalent to `s.groupby(groups).transform(lambda x: x.interpolate(method="linear"))`: values between two
+    known points are interpolated linearly, trailing gaps are forward-filled and leading gaps stay NaN.
+    """
+    # Make groups contiguous so that the global interpolation only runs across rows of the same group
+    order = np.argsort(groups.values, kind="stable")
+    index = s.index
+    s = s.iloc[order]
+    groups = groups.iloc[order]
+    interpolated = s.interpolate(method="linear")
+    ffilled = s.groupby(groups, observed=True).ffill()
+    bfilled = s.groupby(groups, observed=True).bfill()
+    # Leading gaps (nothing to interpolate from) stay NaN; trailing gaps take the last known value
+    interpolated = interpolated.mask(ffilled.isnull())
+    interpolated = interpolated.mask(bfilled.isnull(), ffilled)
+    result = np.empty(len(s))
+    result[order] = interpolated.values
+    return pd.Series(result, index=index)
 
 
 def add_rolling_vaccinations(df: pd.DataFrame) -> pd.DataFrame:
-    return df.groupby("location").apply(_add_rolling).reset_index(drop=True)
+    df = df.reset_index(drop=True)
+    groups = df.location
+    total_vaccinations = restore_column(df.total_vaccinations)
+    # Date of the last reported total_vaccinations, per location
+    last_known_date = df.date.where(total_vaccinations.notnull()).groupby(groups, observed=True).transform("max")
+    after_last_known = df.date > last_known_date
+    daily = _interpolate_by_group(total_vaccinations, groups).groupby(groups, observed=True).diff()
+    for n_months in (6, 9, 12):
+        n_days = round(365.2425 * n_months / 12)
+        rolling = daily.groupby(groups, observed=True).rolling(n_days, min_periods=1).sum()
+        rolling = rolling.reset_index(level=0, drop=True).sort_index().round()
+        rolling[after_last_known] = np.NaN
+        df[f"rolling_vaccinations_{n_months}m"] = rolling
+        df[f"rolling_vaccinations_{n_months}m_per_hundred"] = (rolling * 100 / restore_column(df.population)).round(2)
+    return df
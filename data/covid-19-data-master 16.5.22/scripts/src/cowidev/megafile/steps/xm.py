@@ -1,5 +1,7 @@
 import pandas as pd
 
+from cowidev.megafile.schema import align_categorical
+
 
 def add_excess_mortality(df: pd.DataFrame, wmd_hmd_file: str, economist_file: str) -> pd.DataFrame:
 
@@ -13,6 +15,7 @@ def add_excess_mortality(df: pd.DataFrame, wmd_hmd_file: str, economist_file: st
         "excess_per_million_proj_all_ages": "excess_mortality_count_week_pm",  # excess_mortality_count_week_pm
     }
     wmd_hmd = pd.read_csv(wmd_hmd_file, usecols=["location", "date"] + list(column_mapping.keys()))
+    wmd_hmd = align_categorical(wmd_hmd, df, "location")
     df = df.merge(wmd_hmd, how="left", on=["location", "date"]).rename(columns=column_mapping)
 
     # XM data from The Economist
@@ -35,6 +38,7 @@ def add_excess_mortality(df: pd.DataFrame, wmd_hmd_file: str, economist_file: st
             "estimated_daily_excess_deaths_ci_95_bot_per_100k",
         ],
     ).rename(columns={"country": "location"})
+    econ = align_categorical(econ, df, "location")
     df = df.merge(econ, how="left", on=["location", "date"])
 
     return df
@@ -0,0 +1,169 @@
+"""Data-quality checks for the megafile, run before the exports.
+
+Checks are declared in `MEGAFILE_SCHEMA`, and all of them are run by `validate_megafile` in a single vectorized pass
+over the columns sorted by (location, date), without copying the frame. Checks with severity "error" make
+`ValidationReport.raise_for_errors` fail, while "warning" ones are only reported (e.g. totals can legitimately decrease
+after a source correction).
+
+Example:
+    ```
+    report = validate_megafile(df)
+    report.log(logger)
+    report.raise_for_errors()
+    ```
+"""
+import json
+import os
+from dataclasses import dataclass, field, asdict
+
+import numpy as np
+import pandas as pd
+
+from cowidev.megafile.schema import restore_column
+
+
+@dataclass
+class ColumnSpec:
+    dtype: str = "numeric"  # "numeric" or "string"
+    nullable: bool = True
+    min: float = None
+    max: float = None
+    monotonic: bool = False  # Non-decreasing within each location
+    severity: str = "warning"
+
+
+_TOTAL = ColumnSpec(min=0, monotonic=True)
+
+MEGAFILE_SCHEMA = {
+    "iso_code": ColumnSpec(dtype="string", nullable=False, severity="error"),
+    "location": ColumnSpec(dtype="string", nullable=False, severity="error"),
+    "date": ColumnSpec(dtype="string", nullable=False, severity="error"),
+    "continent": ColumnSpec(dtype="string"),
+    "tests_units": ColumnSpec(dtype="string"),
+    "total_cases": _TOTAL,
+    "total_deaths": _TOTAL,
+    "total_tests": _TOTAL,
+    "total_vaccinations": _TOTAL,
+    "people_vaccinated": _TOTAL,
+    "people_fully_vaccinated": _TOTAL,
+    "total_boosters": _TOTAL,
+    "icu_patients": ColumnSpec(min=0),
+    "hosp_patients": ColumnSpec(min=0),
+    "positive_rate": ColumnSpec(min=0, max=1),
+    "reproduction_rate": ColumnSpec(min=0),
+    "stringency_index": ColumnSpec(min=0, max=100),
+    "population": ColumnSpec(min=0, severity="error"),
+}
+
+# Number of offending (location, date) pairs included in the report for each issue
+MAX_EXAMPLES = 5
+
+
+@dataclass
+class ValidationIssue:
+    check: str
+    column: str
+    severity: str
+    n_rows: int
+    examples: list = field(default_factory=list)
+
+
+@dataclass
+class ValidationReport:
+    n_rows: int
+    issues: list = field(default_factory=list)
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.severity == "error"]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def export(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def log(self, logger):
+        if not self.issues:
+            logger.info(f"Validation passed ({self.n_rows} rows).")
+        for issue in self.issues:
+            msg = f"Validation {issue.severity} [{issue.check}] {issue.column}: {issue.n_rows} rows"
+            msg = f"{msg}, e.g. {issue.examples}"
+            if issue.severity == "error":
+                logger.error(msg)
+            else:
+                logger.warning(msg)
+
+    def raise_for_errors(self):
+        if self.errors:
+            summary = "; ".join(f"[{issue.check}] {issue.column} ({issue.n_rows} rows)" for issue in self.errors)
+            raise ValueError(f"Megafile validation failed: {summary}")
+
+
+def _sort_order(location: np.ndarray, date: np.ndarray):
+    """Positions sorting the frame by (location, date). None if it is already sorted."""
+    same_location = location[1:] == location[:-1]
+    if (location[1:] >= location[:-1]).all() and (date[1:][same_location] >= date[:-1][same_location]).all():
+        return None
+    return np.lexsort((date, location))
+
+
+def validate_megafile(df: pd.DataFrame, schema: dict = MEGAFILE_SCHEMA) -> ValidationReport:
+    """Run all checks declared in `schema` over `df` (columns not in `df` are skipped).
+
+    Besides the column checks, (location, date) pairs are checked to be unique.
+    """
+    report = ValidationReport(n_rows=len(df))
+    location = df["location"].to_numpy(dtype=object)
+    date = df["date"].to_numpy(dtype=object)
+    order = _sort_order(location, date)
+    if order is not None:
+        location, date = location[order], date[order]
+    # Consecutive rows (in sorted order) belonging to the same location
+    same_location = np.concatenate([[False], location[1:] == location[:-1]])
+
+    def add_issue(check, column, severity, mask):
+        n = int(mask.sum())
+        if n > 0:
+            idx = np.flatnonzero(mask)[:MAX_EXAMPLES]
+            examples = [[location[i], date[i]] for i in idx]
+            report.issues.append(ValidationIssue(check, column, severity, n, examples))
+
+    # Uniqueness of (location, date), on the sorted index
+    add_issue("unique", "location, date", "error", same_location & np.concatenate([[False], date[1:] == date[:-1]]))
+
+    for column, spec in schema.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if spec.dtype == "numeric" and not pd.api.types.is_numeric_dtype(values):
+            report.issues.append(ValidationIssue("dtype", column, "error", len(df), [str(values.dtype)]))
+            continue
+        # Categoricals (see `cowidev.megafile.schema`) are checked on their categories
+        inferred = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else values
+        if spec.dtype == "string" and pd.api.types.infer_dtype(inferred, skipna=True) not in ("string", "empty"):
+            report.issues.append(ValidationIssue("dtype", column, spec.severity, len(df), [str(values.dtype)]))
+            continue
+        # Compact numeric columns are checked on their original values
+        values = restore_column(values)
+        values = values.to_numpy(dtype=np.float64 if spec.dtype == "numeric" else object, na_value=np.nan)
+        if order is not None:
+            values = values[order]
+        isnull = pd.isnull(values)
+        if not spec.nullable:
+            add_issue("not_null", column, spec.severity, isnull)
+        if spec.min is not None:
+            add_issue("min", column, spec.severity, values < spec.min)
+        if spec.max is not None:
+            add_issue("max", column, spec.severity, values > spec.max)
+        if spec.monotonic:
+            # Compare each value with the previous non-null value of the same location
+            valid = np.flatnonzero(~isnull)
+            decreasing = np.zeros(len(values), dtype=bool)
+            if len(valid) > 1:
+                prev, curr = valid[:-1], valid[1:]
+                decreasing[curr] = (location[curr] == location[prev]) & (values[curr] < values[prev])
+            add_issue("monotonic", column, spec.severity, decreasing)
+    return report
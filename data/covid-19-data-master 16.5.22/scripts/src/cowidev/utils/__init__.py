@@ -1,5 +1,5 @@
-from cowidev.utils.web import get_soup
-from cowidev.utils.clean import clean_date, clean_date_series, clean_count
+import importlib
+import pkgutil
 
 
 __all__ = [
@@ -7,4 +7,28 @@ __all__ = [
     "clean_date",
     "clean_date_series",
     "clean_count",
+    "list_modules",
 ]
+
+# Re-exports are imported on first access, so that importing cowidev (e.g. for PATHS) doesn't import the scraping
+# stack (requests, bs4, selenium) or pandas.
+_LAZY_IMPORTS = {
+    "get_soup": "cowidev.utils.web",
+    "clean_date": "cowidev.utils.clean",
+    "clean_date_series": "cowidev.utils.clean",
+    "clean_count": "cowidev.utils.clean",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def list_modules(path: str) -> list:
+    """Names of the modules in package directory `path`, listed without importing them.
+
+    Used to list country scrapers without running them.
+    """
+    return [name for _, name, _ in pkgutil.iter_modules([path])]
@@ -0,0 +1,86 @@
+"""Process-wide cache of parsed input files.
+
+Static inputs (population, ISO codes, continents, etc.) are read by several steps of the pipeline. With `read_input`,
+each (file, read options) pair is parsed from CSV only once: the parsed frame is stored as a pickle under
+`INTERNAL_TMP_DIR/inputs`, and later reads load it instead of parsing the CSV again. This also applies across `cowid`
+commands run back-to-back in the same job. Pickles keep the exact frame returned by `pd.read_csv` (dtypes, NaN for
+missing values in object columns, etc.).
+
+Within a process, the most recently used frames are also kept in memory (up to `MAX_CACHED_FRAMES`).
+
+Cached frames are tagged with the modification time and size of the source file, and rebuilt if any of them changes.
+"""
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+
+import pandas as pd
+
+from cowidev import PATHS
+
+
+INPUTS_CACHE_DIR = os.path.join(PATHS.INTERNAL_TMP_DIR, "inputs")
+MAX_CACHED_FRAMES = 16
+
+# Frames already loaded in this process, keyed by (path, options), least recently used first. Values are
+# (signature, frame)
+_FRAMES = OrderedDict()
+
+
+def _signature(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def _cache_file(path: str, options: str) -> str:
+    key = hashlib.md5(f"{os.path.realpath(path)}|{options}".encode()).hexdigest()
+    return os.path.join(INPUTS_CACHE_DIR, f"{key}.pkl")
+
+
+def _read_pickle(cache_file: str, signature: str):
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        cached_signature, df = pd.read_pickle(cache_file)
+    except (pickle.UnpicklingError, EOFError, OSError, ValueError, TypeError):
+        return None
+    if cached_signature != signature:
+        return None
+    return df
+
+
+def _write_pickle(df: pd.DataFrame, signature: str, cache_file: str):
+    os.makedirs(INPUTS_CACHE_DIR, exist_ok=True)
+    # Write to a temporary file first, so that concurrent jobs never read a partially written cache file
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    pd.to_pickle((signature, df), tmp_file)
+    os.replace(tmp_file, cache_file)
+
+
+def read_input(path: str, **kwargs) -> pd.DataFrame:
+    """Read CSV `path` with `pd.read_csv(path, **kwargs)`, reusing the parsed frame if the file did not change.
+
+    Each call returns a copy of the cached frame, which can be safely modified.
+    """
+    key = (path, json.dumps(kwargs, sort_keys=True, default=str))
+    signature = _signature(path)
+    cached = _FRAMES.get(key)
+    if cached is not None and cached[0] == signature:
+        _FRAMES.move_to_end(key)
+        return cached[1].copy()
+
+    cache_file = _cache_file(*key)
+    df = _read_pickle(cache_file, signature)
+    if df is None:
+        df = pd.read_csv(path, **kwargs)
+        try:
+            _write_pickle(df, signature, cache_file)
+        except OSError:
+            pass
+    _FRAMES[key] = (signature, df)
+    _FRAMES.move_to_end(key)
+    while len(_FRAMES) > MAX_CACHED_FRAMES:
+        _FRAMES.popitem(last=False)
+    return df.copy()
@@ -1,5 +1,6 @@
 import zipfile
 import tempfile
+from functools import lru_cache
 
 from cowidev.utils.web.download import download_file_from_url
 
@@ -12,3 +13,10 @@ def extract_zip(input_path, output_folder, **kwargs):
     else:
         z = zipfile.ZipFile(input_path)
     z.extractall(output_folder)
+
+
+@lru_cache(maxsize=None)
+def load_template(path: str) -> str:
+    """Read a template file (once per process)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
@@ -11,10 +11,18 @@ S3_VAX_ICE_DIR = f"{S3_INTERNAL_VAX_DIR}/ice"
 
 # PROJECT DIR ###########################
 def _get_project_dir_from_env(err: bool = False):
+    """Project directory, from env var $OWID_COVID_PROJECT_DIR.
+
+    If not set, the project directory of this source tree is used (<project>/scripts/src/cowidev/utils/paths.py). With
+    `err=True`, an unset variable raises. Note that $OWID_COVID_CONFIG and $OWID_COVID_SECRETS have no such fallback
+    (see CONFIG_FILE and SECRETS_FILE below).
+    """
     project_dir = os.environ.get("OWID_COVID_PROJECT_DIR")
-    if project_dir is None:  # err and
-        raise EnvironmentError("Please set environment variable 'OWID_COVID_PROJECT_DIR'.")
-    elif not os.path.isdir(project_dir):  # err and
+    if project_dir is None:
+        if err:
+            raise EnvironmentError("Please set environment variable 'OWID_COVID_PROJECT_DIR'.")
+        return os.path.abspath(os.path.join(os.path.dirname(__file__), *[os.pardir] * 4))
+    elif not os.path.isdir(project_dir):
         raise EnvironmentError(
             f"Environment variable 'OWID_COVID_PROJECT_DIR' is pointing to a non-existing folder {project_dir}."
         )
@@ -29,6 +37,9 @@ DATA_DIR = os.path.join(PUBLIC_DIR, "data")
 DATA_READ_FILE = os.path.join(DATA_DIR, "README.md")
 DATA_CODEBOOK_FILE = os.path.join(DATA_DIR, "owid-covid-codebook.csv")
 DATA_MAIN_FILE = os.path.join(DATA_DIR, "owid-covid-data.csv")
+DATA_MAIN_PARQUET_FILE = os.path.join(DATA_DIR, "owid-covid-data.parquet")
+DATA_MAIN_FEATHER_FILE = os.path.join(DATA_DIR, "owid-covid-data.feather")
+DATA_SHARDS_DIR = os.path.join(DATA_DIR, "owid-covid-data-by-location")
 
 ## Data excess mortality
 DATA_XM_DIR = os.path.join(DATA_DIR, "excess_mortality")
@@ -64,6 +75,9 @@ DATA_INTERNAL_DIR = os.path.join(DATA_DIR, "internal")
 DATA_INTERNAL_VAX_TABLE = os.path.join(DATA_INTERNAL_DIR, "vaccinations-source-table.html")
 ## Latest
 DATA_LATEST_DIR = os.path.join(DATA_DIR, "latest")
+DATA_LATEST_FILE = os.path.join(DATA_LATEST_DIR, "owid-covid-latest.csv")
+DATA_LATEST_PARQUET_FILE = os.path.join(DATA_LATEST_DIR, "owid-covid-latest.parquet")
+DATA_LATEST_FEATHER_FILE = os.path.join(DATA_LATEST_DIR, "owid-covid-latest.feather")
 ## Timestamps
 DATA_TIMESTAMP_DIR = os.path.join(DATA_INTERNAL_DIR, "timestamp")
 DATA_TIMESTAMP_HOSP_FILE = os.path.join(DATA_TIMESTAMP_DIR, "owid-covid-data-last-updated-timestamp-hosp.txt")
@@ -73,6 +87,8 @@ DATA_TIMESTAMP_VAX_FILE = os.path.join(DATA_TIMESTAMP_DIR, "owid-covid-data-last
 DATA_TIMESTAMP_XM_FILE = os.path.join(DATA_TIMESTAMP_DIR, "owid-covid-data-last-updated-timestamp-xm.txt")
 DATA_TIMESTAMP_JHU_FILE = os.path.join(DATA_TIMESTAMP_DIR, "owid-covid-data-last-updated-timestamp-jhu.txt")
 DATA_TIMESTAMP_OLD_FILE = os.path.join(DATA_TIMESTAMP_DIR, "owid-covid-data-last-updated-timestamp.txt")
+DATA_TIMESTAMP_REPORT_FILE = os.path.join(DATA_TIMESTAMP_DIR, "owid-covid-data-last-updated-report.json")
+DATA_TIMESTAMP_VALIDATION_FILE = os.path.join(DATA_TIMESTAMP_DIR, "owid-covid-data-last-updated-validation.json")
 
 # Internal ########
 INTERNAL_DIR = os.path.join(PROJECT_DIR, "scripts")
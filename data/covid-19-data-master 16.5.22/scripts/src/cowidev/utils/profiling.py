@@ -0,0 +1,141 @@
+"""Lightweight step-level profiling.
+
+Example:
+    ```
+    profiler = StepProfiler(logger)
+    with profiler.step("get_jhu") as step:
+        df = get_jhu()
+        step.set_frame(df)
+    profiler.export("report.json")
+    ```
+
+CPU time, RSS and peak RSS are process-wide figures. CPU time includes the CPU of child processes that finished within
+the step (e.g. process pools). Steps can run concurrently (on threads), in which case these figures can't be
+attributed to any of them: they are only recorded for steps that didn't overlap with a step of another thread
+(`overlapped`).
+"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+import psutil
+
+
+def _rss():
+    return psutil.Process().memory_info().rss
+
+
+def _cpu_time():
+    """CPU time of this process and of its terminated (waited-for) child processes."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class StepRecord:
+    name: str
+    wall_time: float = None
+    cpu_time: float = None
+    rss_delta_mb: float = None
+    peak_rss_delta_mb: float = None
+    peak_rss_mb: float = None
+    rows: int = None
+    columns: int = None
+    # True if other steps ran at the same time (CPU and RSS figures are then not recorded)
+    overlapped: bool = False
+
+    def set_frame(self, df: pd.DataFrame):
+        """Record the shape of the step output."""
+        self.rows, self.columns = df.shape
+
+
+class StepProfiler:
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.steps = []
+        self.started = datetime.utcnow().replace(microsecond=0).isoformat()
+        self._active = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str):
+        """Profile the wrapped block: wall time, and (unless it overlaps with other steps) CPU time, RSS delta and peak
+        RSS delta.
+        """
+        record = StepRecord(name)
+        thread = threading.get_ident()
+        with self._lock:
+            # Steps nested in a step of the same thread don't overlap with it
+            others = [other for other, other_thread in self._active if other_thread != thread]
+            if others:
+                record.overlapped = True
+                for other in others:
+                    other.overlapped = True
+            self._active.append((record, thread))
+        wall, cpu, rss, peak = time.perf_counter(), _cpu_time(), _rss(), _peak_rss()
+        try:
+            yield record
+        finally:
+            record.wall_time = round(time.perf_counter() - wall, 3)
+            with self._lock:
+                self._active = [(other, thread) for other, thread in self._active if other is not record]
+                if not record.overlapped:
+                    record.cpu_time = round(_cpu_time() - cpu, 3)
+                    record.rss_delta_mb = round((_rss() - rss) / 1e6, 1)
+                    record.peak_rss_delta_mb = round((_peak_rss() - peak) / 1e6, 1)
+                record.peak_rss_mb = round(_peak_rss() / 1e6, 1)
+                self.steps.append(record)
+            if self.logger is not None:
+                if record.overlapped:
+                    usage = "(overlapped with other steps)"
+                else:
+                    usage = (
+                        f"cpu={record.cpu_time}s rss_delta={record.rss_delta_mb}MB"
+                        f" peak_rss_delta={record.peak_rss_delta_mb}MB"
+                    )
+                self.logger.info(
+                    f"[{name}] wall={record.wall_time}s {usage} shape=({record.rows}, {record.columns})"
+                )
+
+    def profile(self, name: str = None):
+        """Decorator version of `step`. If the function returns a DataFrame, its shape is recorded."""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.step(name or func.__name__) as record:
+                    result = func(*args, **kwargs)
+                    if isinstance(result, pd.DataFrame):
+                        record.set_frame(result)
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def report(self) -> dict:
+        return {
+            "started": self.started,
+            "finished": datetime.utcnow().replace(microsecond=0).isoformat(),
+            "steps": [asdict(step) for step in self.steps],
+        }
+
+    def export(self, path: str):
+        """Write the run report as JSON."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
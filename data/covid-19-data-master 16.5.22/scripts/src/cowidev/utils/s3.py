@@ -5,12 +5,15 @@ https://github.com/owid/walden/blob/master/owid/walden/owid_cache.py
 import os
 import re
 import json
+import hashlib
+import mimetypes
 import tempfile
 from os import path
 from typing import Optional, Union
 
 import pandas as pd
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 from cowidev.utils.log import get_logger
@@ -18,6 +21,11 @@ from cowidev.utils.log import get_logger
 
 logger = get_logger()
 
+# Large files are uploaded in concurrent parts
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=16 * 1024 * 1024, max_concurrency=10)
+# Object metadata key with the SHA-256 of the uploaded content (see `S3.upload_if_changed`)
+CONTENT_HASH_KEY = "content-sha256"
+
 
 class S3:
     spaces_endpoint = "https://nyc3.digitaloceanspaces.com"
@@ -53,6 +61,7 @@ class S3:
         local_path: Union[str, list],
         s3_path: Union[str, list],
         public: bool = False,
+        metadata: dict = None,
     ) -> Optional[str]:
         """
         Upload file to Walden.
@@ -62,6 +71,7 @@ class S3:
             s3_path (Union[str, list]): File location to load object from. It can be a list of paths, should match
                                         `local_path`'s length.
             public (bool): Set to True to expose the file to the public (read only). Defaults to False.
+            metadata (dict): Custom metadata to store with the object. Defaults to None.
         """
         # print("Uploading to S3…")
         # Checks
@@ -70,14 +80,47 @@ class S3:
         bucket_name, s3_file = _url_to_path_and_bucket_mult(s3_path)
         # Upload
         extra_args = {"ACL": "public-read"} if public else {}
+        if metadata:
+            extra_args["Metadata"] = metadata
+        # Pre-compressed files (e.g. file.csv.gz) are served with the type of the original file and their encoding
+        content_type, content_encoding = mimetypes.guess_type(s3_file)
+        if content_encoding is not None:
+            extra_args["ContentEncoding"] = content_encoding
+            if content_type is not None:
+                extra_args["ContentType"] = content_type
         try:
-            self.client.upload_file(local_path, bucket_name, s3_file, ExtraArgs=extra_args)
+            self.client.upload_file(local_path, bucket_name, s3_file, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
         except ClientError as e:
             logger.error(e)
             raise UploadError(e)
 
         return None
 
+    def upload_if_changed(self, local_path: str, s3_path: str, public: bool = False) -> bool:
+        """Upload file to S3, unless the remote object already has the same content.
+
+        The SHA-256 of the content is stored in the object metadata, and compared with that of `local_path` before
+        uploading.
+
+        Args:
+            local_path (str): Local path to file.
+            s3_path (str): File destination.
+            public (bool): Set to True to expose the file to the public (read only). Defaults to False.
+
+        Returns:
+            bool: True if the file was uploaded, False if it was skipped.
+        """
+        content_hash = file_hash(local_path)
+        try:
+            remote_hash = self.get_metadata(s3_path).get("Metadata", {}).get(CONTENT_HASH_KEY)
+        except ClientError:
+            # Object does not exist (yet)
+            remote_hash = None
+        if remote_hash == content_hash:
+            return False
+        self.upload_to_s3(local_path, s3_path, public=public, metadata={CONTENT_HASH_KEY: content_hash})
+        return True
+
     def download_from_s3(self, s3_path: Union[str, list], local_path: Union[str, list]) -> Optional[str]:
         """Download file from S3.
 
@@ -169,6 +212,15 @@ class S3:
         return response
 
 
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of the content of file `path`."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 def _url_to_path_and_bucket(s3_path):
     """Check if S3 path format is correct"""
     r = "^s3:\/\/([^\/]+)\/((:?(.+)\/)?[^\/]+)$"
@@ -1,5 +1,20 @@
-from .scraping import get_soup, get_driver, request_json
-from .download import read_xlsx_from_url, get_base_url
+import importlib
 
 
-__all__ = ["get_soup", "get_driver", "request_json", "read_xlsx_from_url", "get_base_url"]
+__all__ = ["get_soup", "get_driver", "request_json", "read_xlsx_from_url", "get_base_url", "download_files"]
+
+# Re-exports are imported on first access, so that importing a submodule (e.g. download) doesn't import selenium
+_LAZY_IMPORTS = {
+    "get_soup": "cowidev.utils.web.scraping",
+    "get_driver": "cowidev.utils.web.scraping",
+    "request_json": "cowidev.utils.web.scraping",
+    "read_xlsx_from_url": "cowidev.utils.web.download",
+    "get_base_url": "cowidev.utils.web.download",
+    "download_files": "cowidev.utils.web.download",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,8 @@
+import hashlib
+import json
+import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import pandas as pd
 
@@ -55,6 +59,96 @@ def download_file_from_url(url, save_path, chunk_size=1024 * 1024, timeout=30, v
             fd.write(chunk)
 
 
+def _sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _download_if_modified(session, url: str, path: str, entry: dict, timeout: int, chunk_size: int = 1024 * 1024):
+    """Download `url` into `path`, unless it did not change since the download described by cache `entry`.
+
+    Returns whether `path` changed, and the new cache entry.
+    """
+    headers = {}
+    if os.path.isfile(path):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304:
+            return False, entry
+        r.raise_for_status()
+        sha = hashlib.sha256()
+        tmp_path = f"{path}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    sha.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            # Partial downloads are not kept
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+            raise
+        entry = {
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "sha256": sha.hexdigest(),
+        }
+    # Servers may not support conditional requests: same content is not written again (e.g. keeps its mtime)
+    if os.path.isfile(path) and _sha256(path) == entry["sha256"]:
+        os.remove(tmp_path)
+        return False, entry
+    os.replace(tmp_path, path)
+    return True, entry
+
+
+def download_files(files: dict, cache_path: str, max_workers: int = 8, timeout: int = 60) -> dict:
+    """Download `files` (URL -> local path) concurrently, over a pooled session.
+
+    Requests are conditional (If-None-Match/If-Modified-Since), based on the ETag and Last-Modified headers of the last
+    download of each URL, stored in JSON file `cache_path`. Local files are only written if their content changed.
+
+    If any download fails, the cache is still updated with the downloads that succeeded, and the first error is
+    raised.
+
+    Returns:
+        dict: URL -> True if its local file changed.
+    """
+    cache = {}
+    if os.path.isfile(cache_path):
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=3)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    for path in files.values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            url: executor.submit(_download_if_modified, session, url, path, cache.get(url, {}), timeout)
+            for url, path in files.items()
+        }
+        results, errors = {}, []
+        for url, future in futures.items():
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                errors.append(e)
+    cache.update({url: entry for url, (_, entry) in results.items()})
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    if errors:
+        raise errors[0]
+    return {url: changed for url, (changed, _) in results.items()}
+
+
 class DESAdapter(HTTPAdapter):
     """
     A TransportAdapter that re-enables 3DES support in Requests.
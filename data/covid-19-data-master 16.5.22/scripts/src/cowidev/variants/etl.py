@@ -7,6 +7,7 @@ from cowidev.utils.clean.dates import clean_date, DATE_FORMAT
 from cowidev.utils.web import request_json
 from cowidev import PATHS
 from cowidev.utils.s3 import obj_to_s3
+from cowidev.utils.inputs import read_input
 
 
 class VariantsETL:
@@ -136,7 +137,7 @@ class VariantsETL:
         return total
 
     def pipe_per_capita(self, df: pd.DataFrame) -> pd.DataFrame:
-        df_pop = pd.read_csv(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE, index_col="entity")
+        df_pop = read_input(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE).set_index("entity")
         df = df.merge(df_pop["population"], left_on="location", right_index=True)
         df = df.assign(num_sequences_per_1M=(1000000 * df.num_sequences / df.population).round(2)).drop(
             columns=["population"]
@@ -218,7 +219,7 @@ class VariantsETL:
 
     def pipe_filter_locations(self, df: pd.DataFrame) -> pd.DataFrame:
         # Filter locations
-        dfc = pd.read_csv(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE)
+        dfc = read_input(PATHS.INTERNAL_INPUT_UN_POPULATION_FILE)
         df = df[df.location.isin(dfc.entity.unique())]
         return df
 
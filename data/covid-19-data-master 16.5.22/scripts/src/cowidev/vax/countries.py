@@ -1,5 +1,10 @@
-from cowidev.vax.incremental import __all__ as incremental
-from cowidev.vax.batch import __all__ as batch
+import os
+
+from cowidev.utils import list_modules
+
+
+incremental = list_modules(os.path.join(os.path.dirname(__file__), "incremental"))
+batch = list_modules(os.path.join(os.path.dirname(__file__), "batch"))
 
 
 # Import modules